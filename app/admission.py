@@ -0,0 +1,112 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+import pymongo
+from fastapi.responses import JSONResponse
+from starlette import status
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.settings import settings
+from app.utils.routing import route_template
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    # Requests handled at once; 0 means unlimited
+    max_concurrency: int
+    # Seconds from arrival until every MongoDB operation of the request times out; None means no deadline
+    deadline: Optional[float]
+
+
+DEFAULT_POLICY = RoutePolicy(settings.ADMISSION_MAX_CONCURRENCY, settings.REQUEST_DEADLINE_SECONDS or None)
+
+# Streaming and bulk routes legitimately run long, so they get a small slot count instead of a deadline
+ROUTE_POLICIES: Dict[str, RoutePolicy] = {
+    "/api/products/export": RoutePolicy(max_concurrency=4, deadline=None),
+    "/api/products/import": RoutePolicy(max_concurrency=2, deadline=None),
+    "/metrics": RoutePolicy(max_concurrency=0, deadline=None),
+}
+
+
+class RouteGate:
+    """
+    Concurrency limit for one route: up to `limit` requests run, up to `max_queue` more wait
+    at most `queue_timeout` seconds for a slot, and everything beyond that is turned away at once.
+    """
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+
+    async def acquire(self) -> bool:
+        if not self.semaphore.locked():
+            await self.semaphore.acquire()
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self.semaphore.release()
+
+
+class AdmissionMiddleware:
+    """
+    Load shedding and query deadlines per route template.
+    When a route is saturated, requests queue briefly and then get a fast 503 with Retry-After,
+    rather than piling up behind a slow database. Admitted requests run under pymongo.timeout,
+    so every MongoDB operation they make carries the remaining time as maxTimeMS and fails
+    instead of holding the worker past the deadline.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.gates: Dict[str, RouteGate] = {}
+
+    def _gate(self, route: str, policy: RoutePolicy) -> Optional[RouteGate]:
+        if policy.max_concurrency <= 0:
+            return None
+        gate = self.gates.get(route)
+        if gate is None:
+            gate = self.gates[route] = RouteGate(
+                policy.max_concurrency, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_QUEUE_TIMEOUT
+            )
+        return gate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.monotonic()
+        route = route_template(scope)
+        policy = ROUTE_POLICIES.get(route, DEFAULT_POLICY)
+        gate = self._gate(route, policy)
+
+        if gate is not None and not await gate.acquire():
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"message": "Server is busy, please retry shortly"},
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            if policy.deadline is None:
+                await self.app(scope, receive, send)
+            else:
+                # Time spent queueing counts against the deadline
+                with pymongo.timeout(max(policy.deadline - (time.monotonic() - arrived), 0.001)):
+                    await self.app(scope, receive, send)
+        finally:
+            if gate is not None:
+                gate.release()
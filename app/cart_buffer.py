@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import Dict, Optional, Tuple
+from bson import ObjectId
+from app.crud import cart as cart_crud
+from app.settings import settings
+from app.utils.background import run_detached
+
+logger = logging.getLogger(__name__)
+
+
+class CartWriteBuffer:
+    """
+    Write-behind buffer for cart quantity changes. Bursts of +1/-1 clicks on the same item
+    are summed in memory and written as one net change per (user, product) in a single bulk write.
+    Deltas are flushed every flush_interval seconds, as soon as max_pending items are waiting,
+    before any read of that user's cart, and on shutdown. A crash (or a failed flush) loses
+    at most the deltas of one interval, which is the durability bound the settings control.
+    """
+    def __init__(self, flush_interval: float, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending: Dict[ObjectId, Dict[ObjectId, int]] = defaultdict(dict)
+        self.pending_count = 0
+        # Stored quantities read to vet reduces, valid until the user's deltas are flushed
+        self.stored: Dict[ObjectId, Dict[ObjectId, int]] = defaultdict(dict)
+        # Held while a user's deltas are being written, so their next read waits for that write
+        # and no one else's. Dropped once no coroutine holds or waits for them.
+        self._locks: Dict[ObjectId, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._task: Optional[asyncio.Task] = None
+
+    def lock(self, user_id: ObjectId) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def add(self, user_id: str, product_id: str, delta: int) -> Optional[int]:
+        """
+        Queue a quantity change and return the net change still pending for the item.
+        A reduce that would take the item below zero is refused with None, the same as
+        reducing an item that isn't in the cart, so it can't cancel a later add.
+        """
+        user_id, product_id = ObjectId(user_id), ObjectId(product_id)
+        if delta < 0 and self.pending.get(user_id, {}).get(product_id, 0) + delta < 0:
+            # Only the stored quantity can cover it; under the user's lock none of their deltas
+            # is mid-write, so the stored quantity and the pending delta agree
+            async with self.lock(user_id):
+                stored = self.stored[user_id].get(product_id)
+                if stored is None:
+                    stored = self.stored[user_id][product_id] = await cart_crud.get_cart_quantity(user_id, product_id)
+                if stored + self.pending.get(user_id, {}).get(product_id, 0) + delta < 0:
+                    return None
+                pending = self._queue(user_id, product_id, delta)
+        else:
+            pending = self._queue(user_id, product_id, delta)
+
+        if self.pending_count >= self.max_pending:
+            await self.flush()
+        return pending
+
+    def _queue(self, user_id: ObjectId, product_id: ObjectId, delta: int) -> int:
+        items = self.pending[user_id]
+        if product_id not in items:
+            self.pending_count += 1
+        items[product_id] = items.get(product_id, 0) + delta
+        return items[product_id]
+
+    async def flush_user(self, user_id: str):
+        """
+        Write one user's pending deltas so a following read of their cart sees them.
+        """
+        user_id = ObjectId(user_id)
+        async with self.lock(user_id):
+            self.stored.pop(user_id, None)
+            items = self.pending.pop(user_id, None)
+            if items:
+                self.pending_count -= len(items)
+                await self._write({(user_id, product_id): delta for product_id, delta in items.items()})
+
+    async def flush(self):
+        """
+        Write every pending delta in one bulk write. Only the users in the batch are locked,
+        so reads of any other cart go ahead while it is written.
+        """
+        self.stored = defaultdict(dict)
+        if not self.pending_count:
+            return
+        async with AsyncExitStack() as locks:
+            # In a fixed order, so concurrent flushes can't deadlock on each other's users
+            user_ids = sorted(self.pending)
+            for user_id in user_ids:
+                await locks.enter_async_context(self.lock(user_id))
+
+            deltas = {}
+            for user_id in user_ids:
+                # Already written by a flush_user that held the lock first
+                items = self.pending.pop(user_id, None)
+                if items:
+                    self.pending_count -= len(items)
+                    deltas.update({(user_id, product_id): delta for product_id, delta in items.items()})
+            if deltas:
+                await self._write(deltas)
+
+    async def _write(self, deltas: Dict[Tuple[ObjectId, ObjectId], int]):
+        try:
+            # Detached from the request that triggered the flush: its deadline must not drop
+            # the deltas of every other user, or its own
+            await run_detached(cart_crud.apply_cart_deltas(deltas))
+        except Exception as e:
+            # Retrying could apply part of the batch twice, so the deltas are dropped
+            logger.error("Cart write-behind flush failed, %d item changes lost: %s", len(deltas), e)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Shielded so stopping mid-write doesn't drop the deltas already taken out of the buffer
+            await asyncio.shield(self.flush())
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+cart_buffer = CartWriteBuffer(
+    flush_interval=settings.CART_FLUSH_INTERVAL_MS / 1000,
+    max_pending=settings.CART_BUFFER_MAX_PENDING
+)
@@ -0,0 +1,31 @@
+from typing import Any, Dict, Optional, Type, TypeVar
+from mongoengine import Document
+from app.database import get_collection
+
+TDocument = TypeVar('TDocument', bound=Document)
+
+
+def to_document(document_cls: Type[TDocument], son: Dict[str, Any]) -> TDocument:
+    """
+    Build a MongoEngine document from a raw MongoDB document.
+    References are left as DBRefs so reading them never triggers a blocking fetch.
+    """
+    return document_cls._from_son(son, _auto_dereference=False)
+
+
+async def insert_document(document: TDocument) -> TDocument:
+    document.validate()
+    son = document.to_mongo().to_dict()
+    result = await get_collection(type(document)).insert_one(son)
+    son['_id'] = result.inserted_id
+    return to_document(type(document), son)
+
+
+async def find_document(document_cls: Type[TDocument], query: Dict[str, Any]) -> Optional[TDocument]:
+    son = await get_collection(document_cls).find_one(query)
+    return to_document(document_cls, son) if son else None
+
+
+async def delete_documents(document_cls: Type[TDocument], query: Dict[str, Any]) -> int:
+    result = await get_collection(document_cls).delete_many(query)
+    return result.deleted_count
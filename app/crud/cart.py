@@ -0,0 +1,281 @@
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.models.cart import CartItem
+from app.models.product import Product
+from app.models.inventory import StockShard
+from app.crud.base import delete_documents
+from app.crud.inventory import add_shard_stock
+from app.database import database, get_collection
+from app.utils.background import run_detached
+
+
+async def get_cart_items(user_id: str) -> List[Dict[str, Any]]:
+    # Raw documents keep user_id/product_id as plain ObjectIds, so nothing is dereferenced
+    cursor = get_collection(CartItem).find({'user_id': ObjectId(user_id)})
+    return await cursor.to_list(length=None)
+
+
+async def get_cart_items_with_products(user_id: str) -> List[Dict[str, Any]]:
+    # Joins the product summary in the same round trip instead of one fetch per item
+    pipeline = [
+        {'$match': {'user_id': ObjectId(user_id)}},
+        {'$lookup': {
+            'from': Product._get_collection_name(),
+            'localField': 'product_id',
+            'foreignField': '_id',
+            'as': 'product'
+        }},
+        {'$unwind': {'path': '$product', 'preserveNullAndEmptyArrays': True}},
+        {'$project': {
+            'user_id': 1,
+            'product_id': 1,
+            'quantity': 1,
+            'createdAt': 1,
+            'updatedAt': 1,
+            'product._id': 1,
+            'product.name': 1,
+            'product.price': 1,
+            'product.stock': 1,
+            'product.stockShards': 1
+        }}
+    ]
+    cursor = get_collection(CartItem).aggregate(pipeline)
+    cart_items = await cursor.to_list(length=None)
+    await add_shard_stock([cart_item['product'] for cart_item in cart_items if cart_item.get('product')])
+    return cart_items
+
+
+async def get_cart_summary(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Item count, subtotal and the products that can't cover their cart quantity, in one aggregation.
+    Split-stock products count their shards towards the available stock.
+    Returns None for an empty cart.
+    """
+    pipeline = [
+        {'$match': {'user_id': ObjectId(user_id)}},
+        {'$lookup': {
+            'from': Product._get_collection_name(),
+            'localField': 'product_id',
+            'foreignField': '_id',
+            'as': 'product'
+        }},
+        {'$unwind': {'path': '$product', 'preserveNullAndEmptyArrays': True}},
+        {'$lookup': {
+            'from': StockShard._get_collection_name(),
+            'localField': 'product_id',
+            'foreignField': 'product_id',
+            'as': 'shards'
+        }},
+        {'$project': {
+            'product_id': 1,
+            'quantity': 1,
+            'price': {'$ifNull': ['$product.price', 0]},
+            # Products deleted since they were added count as out of stock
+            'available': {'$cond': [
+                {'$ifNull': ['$product._id', False]},
+                {'$add': ['$product.stock', {'$sum': '$shards.stock'}]},
+                0
+            ]}
+        }},
+        {'$group': {
+            '_id': None,
+            'items': {'$sum': 1},
+            'quantity': {'$sum': '$quantity'},
+            'subtotal': {'$sum': {'$multiply': ['$price', '$quantity']}},
+            'out_of_stock': {'$push': {'$cond': [{'$lt': ['$available', '$quantity']}, '$product_id', None]}}
+        }},
+        {'$project': {
+            '_id': 0,
+            'items': 1,
+            'quantity': 1,
+            'subtotal': 1,
+            'out_of_stock': {'$filter': {'input': '$out_of_stock', 'cond': {'$ne': ['$$this', None]}}}
+        }}
+    ]
+    cursor = get_collection(CartItem).aggregate(pipeline)
+    summaries = await cursor.to_list(length=1)
+    return summaries[0] if summaries else None
+
+
+async def get_cart_quantity(user_id: ObjectId, product_id: ObjectId) -> int:
+    # 0 when the product isn't in the cart
+    cart_item = await get_collection(CartItem).find_one({'user_id': user_id, 'product_id': product_id}, {'quantity': 1})
+    return cart_item['quantity'] if cart_item else 0
+
+
+async def increment_cart_item(user_id: str, product_id: str) -> Dict[str, Any]:
+    now = datetime.datetime.utcnow()
+    query = {'user_id': ObjectId(user_id), 'product_id': ObjectId(product_id)}
+    update = {
+        '$inc': {'quantity': 1},
+        '$set': {'updatedAt': now},
+        '$setOnInsert': {'createdAt': now}
+    }
+    try:
+        return await get_collection(CartItem).find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Two concurrent upserts both inserted; the unique index let one win, so this one is now a plain $inc
+        return await get_collection(CartItem).find_one_and_update(
+            query, update, return_document=ReturnDocument.AFTER
+        )
+
+
+async def decrement_cart_item(user_id: str, product_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Atomically take one off a cart item's quantity, removing the item when it would reach 0.
+    Returns the updated (or removed) document and whether it was removed; (None, False) if absent.
+    """
+    collection = get_collection(CartItem)
+    query = {'user_id': ObjectId(user_id), 'product_id': ObjectId(product_id)}
+
+    # A concurrent add can move the quantity across 1 between the two steps, so retry once
+    for _ in range(2):
+        cart_item = await collection.find_one_and_update(
+            {**query, 'quantity': {'$gt': 1}},
+            {'$inc': {'quantity': -1}, '$set': {'updatedAt': datetime.datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if cart_item:
+            return cart_item, False
+
+        cart_item = await collection.find_one_and_delete({**query, 'quantity': {'$lte': 1}})
+        if cart_item:
+            return cart_item, True
+
+    return None, False
+
+
+async def apply_cart_deltas(deltas: Dict[Tuple[ObjectId, ObjectId], int]):
+    """
+    Apply net quantity changes for many (user_id, product_id) pairs in bulk.
+    Positive deltas upsert the item; negative ones only touch existing items,
+    which are removed once their quantity drops to 0 or below.
+    """
+    collection = get_collection(CartItem)
+    now = datetime.datetime.utcnow()
+    operations: List[Tuple[Dict[str, Any], Dict[str, Any], bool]] = []
+    emptied = []
+    for (user_id, product_id), delta in deltas.items():
+        if delta == 0:
+            continue
+        query = {'user_id': user_id, 'product_id': product_id}
+        update = {'$inc': {'quantity': delta}, '$set': {'updatedAt': now}}
+        if delta > 0:
+            operations.append((query, {**update, '$setOnInsert': {'createdAt': now}}, True))
+        else:
+            operations.append((query, update, False))
+            emptied.append(query)
+
+    if operations:
+        try:
+            await collection.bulk_write(
+                [UpdateOne(query, update, upsert=upsert) for query, update, upsert in operations], ordered=False
+            )
+        except BulkWriteError as e:
+            # Upserts that raced another writer's insert; the item exists now, so retry them as plain updates
+            retries = []
+            for error in e.details['writeErrors']:
+                if error['code'] != 11000:
+                    raise
+                query, update, _ = operations[error['index']]
+                retries.append(UpdateOne(query, update))
+            await collection.bulk_write(retries, ordered=False)
+
+    if emptied:
+        await collection.bulk_write(
+            [DeleteMany({**query, 'quantity': {'$lte': 0}}) for query in emptied], ordered=False
+        )
+
+
+async def apply_cart_operations(user_id: str, operations: List[Tuple[str, ObjectId, int]]):
+    """
+    Apply ("add" | "set" | "remove", product_id, quantity) operations to one user's cart
+    as a single ordered bulk_write, inside a transaction when the deployment supports it
+    so the cart never shows half of the batch.
+    """
+    user_id = ObjectId(user_id)
+    now = datetime.datetime.utcnow()
+    requests = []
+    for op, product_id, quantity in operations:
+        query = {'user_id': user_id, 'product_id': product_id}
+        if op == 'remove' or (op == 'set' and quantity == 0):
+            requests.append(DeleteOne(query))
+        elif op == 'set':
+            requests.append(UpdateOne(query, {
+                '$set': {'quantity': quantity, 'updatedAt': now},
+                '$setOnInsert': {'createdAt': now}
+            }, upsert=True))
+        else:
+            requests.append(UpdateOne(query, {
+                '$inc': {'quantity': quantity},
+                '$set': {'updatedAt': now},
+                '$setOnInsert': {'createdAt': now}
+            }, upsert=True))
+
+    collection = get_collection(CartItem)
+    if not database.is_replica_set:
+        await collection.bulk_write(requests, ordered=True)
+        return
+
+    async with await database.client.start_session() as session:
+        async with session.start_transaction():
+            await collection.bulk_write(requests, ordered=True, session=session)
+
+
+async def delete_cart_item(user_id: str, cart_item_id: str) -> int:
+    return await delete_documents(CartItem, {'_id': ObjectId(cart_item_id), 'user_id': ObjectId(user_id)})
+
+
+async def claim_cart_items(user_id: str, cart_item_ids: List[ObjectId]) -> List[Dict[str, Any]]:
+    """
+    Delete the cart items one at a time in _id order and return them as they were deleted.
+    Each find_one_and_delete hands an item to exactly one caller, and the fixed order makes
+    concurrent claims of the same cart collide on the first item, so one checkout takes the whole
+    cart and the others stop at once. Stops at the first item that is already gone.
+    """
+    collection = get_collection(CartItem)
+    claimed = []
+    for cart_item_id in sorted(cart_item_ids):
+        cart_item = await collection.find_one_and_delete({'_id': cart_item_id, 'user_id': ObjectId(user_id)})
+        if not cart_item:
+            break
+        claimed.append(cart_item)
+    return claimed
+
+
+async def restore_cart_items(cart_items: List[Dict[str, Any]]):
+    # Added back as deltas, so quantities added since the claim are kept. Runs detached from
+    # the checkout that claimed them, whose deadline may be what failed it
+    deltas = {(item['user_id'], item['product_id']): item['quantity'] for item in cart_items}
+    await run_detached(apply_cart_deltas(deltas))
+
+
+async def merge_duplicate_cart_items() -> int:
+    """
+    Fold cart items that repeat a (user_id, product_id) pair into the oldest of them, summing
+    their quantities, so the unique index on the pair can be built. Returns how many were removed.
+    """
+    collection = get_collection(CartItem)
+    pipeline = [
+        {'$sort': {'_id': 1}},
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'product_id': '$product_id'},
+            'ids': {'$push': '$_id'},
+            'quantity': {'$sum': '$quantity'}
+        }},
+        {'$match': {'ids.1': {'$exists': True}}}
+    ]
+    removed = 0
+    async for duplicate in collection.aggregate(pipeline, allowDiskUse=True):
+        keep, *extra = duplicate['ids']
+        await collection.update_one(
+            {'_id': keep}, {'$set': {'quantity': duplicate['quantity'], 'updatedAt': datetime.datetime.utcnow()}}
+        )
+        result = await collection.delete_many({'_id': {'$in': extra}})
+        removed += result.deleted_count
+    return removed
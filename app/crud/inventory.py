@@ -0,0 +1,186 @@
+import asyncio
+import datetime
+import random
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.models.product import Product
+from app.models.inventory import StockShard
+from app.database import get_collection
+from app.utils.background import run_detached
+
+# Only products that aren't currently split
+NOT_SPLIT = {'stockShards': {'$not': {'$gt': 0}}}
+
+
+async def take_product_stock(product_id: ObjectId, quantity: int) -> bool:
+    # Conditional $inc, so stock can never go below zero
+    result = await get_collection(Product).update_one(
+        {'_id': product_id, 'stock': {'$gte': quantity}},
+        {'$inc': {'stock': -quantity}, '$set': {'updatedAt': datetime.datetime.utcnow()}}
+    )
+    return bool(result.modified_count)
+
+
+async def take_shard_stock(product_id: ObjectId, shard: int, quantity: int) -> bool:
+    result = await get_collection(StockShard).update_one(
+        {'product_id': product_id, 'shard': shard, 'stock': {'$gte': quantity}},
+        {'$inc': {'stock': -quantity}}
+    )
+    return bool(result.modified_count)
+
+
+async def reserve_stock(product_id: ObjectId, quantity: int, shards: int = 0) -> Optional[List[Dict[str, Any]]]:
+    """
+    Take quantity units of a product, all or nothing.
+    A split product first tries one shard picked at random, which spreads concurrent checkouts
+    of a hot product over several documents. When no single shard holds enough, units are
+    gathered from every shard that has some and then from the product's own stock; if they
+    still don't add up, whatever was taken is released again.
+    Args:
+        product_id (ObjectId): The product to reserve from.
+        quantity (int): Units to reserve.
+        shards (int): The product's stockShards.
+    Returns:
+        list: The takes as {'shard', 'quantity'} dicts (shard None for the product's own stock),
+            or None if there isn't enough stock.
+    """
+    if not shards:
+        return [{'shard': None, 'quantity': quantity}] if await take_product_stock(product_id, quantity) else None
+
+    shard = random.randrange(shards)
+    if await take_shard_stock(product_id, shard, quantity):
+        return [{'shard': shard, 'quantity': quantity}]
+
+    cursor = get_collection(StockShard).find({'product_id': product_id, 'stock': {'$gt': 0}}, {'shard': 1, 'stock': 1})
+    available = [(document['shard'], document['stock']) for document in await cursor.to_list(length=None)]
+    random.shuffle(available)
+    product = await get_collection(Product).find_one({'_id': product_id}, {'stock': 1})
+    if product and product['stock'] > 0:
+        available.append((None, product['stock']))
+
+    takes = []
+    remaining = quantity
+    try:
+        for shard, stock in available:
+            amount = min(stock, remaining)
+            # A concurrent reservation may have taken these units since they were read; skip the counter then
+            taken = await (take_product_stock(product_id, amount) if shard is None else take_shard_stock(product_id, shard, amount))
+            if taken:
+                takes.append({'shard': shard, 'quantity': amount})
+                remaining -= amount
+                if not remaining:
+                    return takes
+    except BaseException:
+        # The caller only learns about the failure, not the partial takes, so give them back here,
+        # outside the request deadline that may be what failed
+        await run_detached(release_takes(product_id, takes))
+        raise
+
+    await release_takes(product_id, takes)
+    return None
+
+
+async def release_stock(product_id: ObjectId, quantity: int, shard: Optional[int] = None):
+    """
+    Return reserved units to where they were taken from.
+    """
+    if shard is not None:
+        result = await get_collection(StockShard).update_one(
+            {'product_id': product_id, 'shard': shard},
+            {'$inc': {'stock': quantity}}
+        )
+        if result.matched_count:
+            return
+        # The shards were merged back into the product since the reservation
+
+    await get_collection(Product).update_one(
+        {'_id': product_id},
+        {'$inc': {'stock': quantity}, '$set': {'updatedAt': datetime.datetime.utcnow()}}
+    )
+
+
+async def release_takes(product_id: ObjectId, takes: List[Dict[str, Any]]):
+    await asyncio.gather(*(release_stock(product_id, take['quantity'], take.get('shard')) for take in takes))
+
+
+async def split_stock(product_id: str, shards: int) -> Optional[Dict[str, Any]]:
+    """
+    Move a product's stock into `shards` StockShard counters.
+    Returns the product as it was before the split, or None if it doesn't exist or is already split.
+    """
+    product = await get_collection(Product).find_one_and_update(
+        {'_id': ObjectId(product_id), **NOT_SPLIT},
+        {'$set': {'stock': 0, 'stockShards': shards, 'updatedAt': datetime.datetime.utcnow()}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not product:
+        return None
+
+    per_shard, remainder = divmod(product['stock'], shards)
+    await get_collection(StockShard).insert_many([
+        {'product_id': product['_id'], 'shard': shard, 'stock': per_shard + (1 if shard < remainder else 0)}
+        for shard in range(shards)
+    ])
+    return product
+
+
+async def merge_stock(product_id: str) -> Optional[int]:
+    """
+    Fold a split product's shards back into its own stock.
+    Each shard is deleted and credited atomically, so reservations racing with the merge
+    either hit the shard first or fall back to the product.
+    Returns the number of units moved, or None if the product isn't split.
+    """
+    product_id = ObjectId(product_id)
+    product = await get_collection(Product).find_one_and_update(
+        {'_id': product_id, 'stockShards': {'$gt': 0}},
+        {'$set': {'stockShards': 0}}
+    )
+    if not product:
+        return None
+
+    moved = 0
+    while True:
+        shard = await get_collection(StockShard).find_one_and_delete({'product_id': product_id})
+        if not shard:
+            return moved
+        await release_stock(product_id, shard['stock'])
+        moved += shard['stock']
+
+
+async def add_shard_stock(products: List[Dict[str, Any]]):
+    """
+    Add the units held in stock shards to the stock of the split products among raw product
+    documents, in one aggregation and only when there are any.
+    """
+    split = {product['_id']: product for product in products if product.get('stockShards') and 'stock' in product}
+    if not split:
+        return
+    cursor = get_collection(StockShard).aggregate([
+        {'$match': {'product_id': {'$in': list(split)}}},
+        {'$group': {'_id': '$product_id', 'stock': {'$sum': '$stock'}}}
+    ])
+    for total in await cursor.to_list(length=None):
+        split[total['_id']]['stock'] += total['stock']
+
+
+async def get_stock(product_id: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns (available units, shard count) for a product, or None if it doesn't exist.
+    """
+    product = await get_collection(Product).find_one({'_id': ObjectId(product_id)}, {'stock': 1, 'stockShards': 1})
+    if not product:
+        return None
+
+    stock = product['stock']
+    shards = product.get('stockShards') or 0
+    if shards:
+        cursor = get_collection(StockShard).aggregate([
+            {'$match': {'product_id': product['_id']}},
+            {'$group': {'_id': None, 'stock': {'$sum': '$stock'}}}
+        ])
+        totals = await cursor.to_list(length=1)
+        if totals:
+            stock += totals[0]['stock']
+    return stock, shards
@@ -0,0 +1,73 @@
+import datetime
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.models.order import Order
+from app.crud.base import insert_document
+from app.database import get_collection
+
+
+async def create_order(order: Order) -> Order:
+    return await insert_document(order)
+
+
+async def get_order(user_id: str, order_id: str) -> Optional[Dict[str, Any]]:
+    return await get_collection(Order).find_one({'_id': ObjectId(order_id), 'user_id': ObjectId(user_id)})
+
+
+async def transition_order(
+    user_id: str,
+    order_id: str,
+    status: str,
+    query: Optional[Dict[str, Any]] = None,
+    values: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Atomically move a reserved order to `status`, setting any extra `values`. Only one caller
+    can win the transition, so only one of them releases or keeps the reserved stock.
+    Returns the updated order, or None if it isn't (or is no longer) reserved.
+    """
+    return await get_collection(Order).find_one_and_update(
+        {'_id': ObjectId(order_id), 'user_id': ObjectId(user_id), 'status': 'reserved', **(query or {})},
+        {'$set': {**(values or {}), 'status': status, 'updatedAt': datetime.datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def claim_expired_order(now: datetime.datetime) -> Optional[Dict[str, Any]]:
+    """
+    Move one reserved order past its expiry to releasing and return it, or None if there are none left.
+    """
+    return await get_collection(Order).find_one_and_update(
+        {'status': 'reserved', 'expiresAt': {'$lte': now}},
+        {'$set': {'status': 'releasing', 'releaseTo': 'expired', 'updatedAt': now}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def claim_stalled_release(now: datetime.datetime, stalled_before: datetime.datetime) -> Optional[Dict[str, Any]]:
+    """
+    Take over one releasing order nobody has made progress on since `stalled_before`, or None.
+    Bumping updatedAt leases it, so concurrent sweepers don't release it at the same time.
+    """
+    return await get_collection(Order).find_one_and_update(
+        {'status': 'releasing', 'updatedAt': {'$lte': stalled_before}},
+        {'$set': {'updatedAt': now}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def mark_take_released(order_id: ObjectId, item_index: int, take_index: int):
+    await get_collection(Order).update_one(
+        {'_id': order_id},
+        {'$set': {f'items.{item_index}.takes.{take_index}.released': True, 'updatedAt': datetime.datetime.utcnow()}}
+    )
+
+
+async def finish_release(order: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return await get_collection(Order).find_one_and_update(
+        {'_id': order['_id'], 'status': 'releasing'},
+        {'$set': {'status': order['releaseTo'], 'updatedAt': datetime.datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
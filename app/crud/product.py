@@ -0,0 +1,278 @@
+import datetime
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.models.product import Product
+from app.models.inventory import StockShard
+from motor.motor_asyncio import AsyncIOMotorCursor
+from app.database import get_collection
+from app.crud.base import insert_document, find_document, delete_documents
+from app.crud.inventory import NOT_SPLIT
+
+
+async def create_product(product: Product) -> Product:
+    return await insert_document(product)
+
+
+async def get_products_page(
+    limit: int,
+    after: Optional[Tuple[datetime.datetime, ObjectId]] = None,
+    fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Fetch one page of raw product documents, newest first, starting after the (createdAt, _id) keyset position.
+    The sort matches the declared (createdAt, _id) index, so each page costs the same regardless of depth.
+    """
+    query = {}
+    if after:
+        created_at, last_id = after
+        query = {'$or': [
+            {'createdAt': {'$lt': created_at}},
+            {'createdAt': created_at, '_id': {'$lt': last_id}}
+        ]}
+
+    # createdAt builds the next cursor
+    projection = dict.fromkeys(['createdAt', *fields, *stock_fields(fields)], 1) if fields else None
+
+    cursor = get_collection(Product).find(query, projection) \
+        .sort([('createdAt', -1), ('_id', -1)]) \
+        .limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+def stock_fields(fields: List[str]) -> List[str]:
+    # Split products need stockShards to report their total stock
+    return ['stockShards'] if 'stock' in fields else []
+
+
+# Sort order -> (key field, direction); _id in the same direction breaks ties
+SEARCH_SORTS = {
+    'newest': ('createdAt', -1),
+    'price_asc': ('price', 1),
+    'price_desc': ('price', -1)
+}
+
+
+def build_search_query(
+    q: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    sort: str = 'newest',
+    after: Optional[Tuple[Any, ObjectId]] = None
+) -> Tuple[Dict[str, Any], List[Tuple[str, Any]]]:
+    """
+    Build the filter and sort for a product search. `after` is the (sort key, _id) keyset
+    position of the previous page; relevance order pages by offset instead.
+    Without a text query, the in-stock and keyset alternatives are distributed into one top-level
+    $or of plain conjunctions. Each branch then becomes index bounds on the sort index and the
+    branches are merged in sort order, so no document is fetched only to be filtered out.
+    """
+    clauses: List[Dict[str, Any]] = []
+    alternatives: List[List[Dict[str, Any]]] = []
+    if q:
+        clauses.append({'$text': {'$search': q}})
+    price: Dict[str, float] = {}
+    if min_price is not None:
+        price['$gte'] = min_price
+    if max_price is not None:
+        price['$lte'] = max_price
+    if price:
+        clauses.append({'price': price})
+    if in_stock:
+        # Split-stock products keep their units in shards, so treat them as in stock
+        alternatives.append([{'stock': {'$gt': 0}}, {'stockShards': {'$gt': 0}}])
+
+    if sort == 'relevance':
+        order = [('score', {'$meta': 'textScore'}), ('_id', -1)]
+    else:
+        field, direction = SEARCH_SORTS[sort]
+        if after:
+            value, last_id = after
+            operator = '$gt' if direction == 1 else '$lt'
+            alternatives.append([
+                {field: {operator: value}},
+                {field: value, '_id': {operator: last_id}}
+            ])
+        order = [(field, direction), ('_id', direction)]
+
+    if q or not alternatives:
+        # A query may hold only one $text, so text searches keep their alternatives nested
+        return conjunction(clauses + [{'$or': choices} for choices in alternatives]), order
+    return {'$or': [conjunction(clauses + list(choice)) for choice in itertools.product(*alternatives)]}, order
+
+
+def conjunction(clauses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def find_search_products(
+    query: Dict[str, Any],
+    order: List[Tuple[str, Any]],
+    limit: int,
+    fields: Optional[List[str]] = None,
+    skip: int = 0
+) -> AsyncIOMotorCursor:
+    # The sort keys are always projected, the next cursor is built from them
+    projection = dict.fromkeys(['createdAt', 'price', *fields, *stock_fields(fields)], 1) if fields else None
+    if order[0][0] == 'score':
+        projection = {**(projection or {}), 'score': {'$meta': 'textScore'}}
+    return get_collection(Product).find(query, projection).sort(order).skip(skip).limit(limit)
+
+
+async def search_products(
+    q: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    in_stock: bool,
+    sort: str,
+    limit: int,
+    after: Optional[Tuple[Any, ObjectId]] = None,
+    skip: int = 0,
+    fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Fetch one page of raw product documents matching the search.
+    Every sort order except relevance is served by an index ((createdAt, _id, ...) or (price, _id, ...))
+    whose trailing keys carry the price and stock filters, and text queries by the text index on name and description.
+    """
+    query, order = build_search_query(q, min_price, max_price, in_stock, sort, after)
+    cursor = find_search_products(query, order, limit, fields, skip)
+    return await cursor.to_list(length=limit)
+
+
+def iter_products(after_id: Optional[str] = None, batch_size: int = 1000) -> AsyncIOMotorCursor:
+    """
+    Server-side cursor over every product in _id order, resuming after `after_id`.
+    _id never changes, so a resumed export neither skips nor repeats products.
+    """
+    query = {'_id': {'$gt': ObjectId(after_id)}} if after_id else {}
+    return get_collection(Product).find(query).sort('_id', 1).batch_size(batch_size)
+
+
+async def get_product(product_id: str) -> Optional[Product]:
+    return await find_document(Product, {'_id': ObjectId(product_id)})
+
+
+async def get_products_by_ids(product_ids: List[ObjectId]) -> List[Dict[str, Any]]:
+    """
+    Fetch many products in one $in query. The result is in no particular order.
+    """
+    cursor = get_collection(Product).find({'_id': {'$in': product_ids}})
+    return await cursor.to_list(length=None)
+
+
+def validate_product_fields(values: Dict[str, Any]):
+    # Targeted updates skip document validation, so apply the model's field rules here
+    for name, value in values.items():
+        Product._fields[name].validate(value)
+
+
+async def update_product_fields(product_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Atomically $set only the given fields and return the updated raw document, or None if it
+    doesn't exist or the update sets the stock of a product whose stock is split into shards.
+    """
+    validate_product_fields(values)
+    return await get_collection(Product).find_one_and_update(
+        {'_id': ObjectId(product_id), **(NOT_SPLIT if 'stock' in values else {})},
+        {'$set': {**values, 'updatedAt': datetime.datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def bulk_update_products(updates: List[Tuple[ObjectId, Dict[str, Any], Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Apply (id, $set fields, $inc fields) updates in one unordered bulk_write.
+    Setting stock is refused for products whose stock is split into shards, since it would only
+    overwrite the product's own part; stock deltas still apply to it.
+    Returns the write counts, the ids that matched no product and the ids refused as split.
+    """
+    now = datetime.datetime.utcnow()
+    operations = []
+    for product_id, set_fields, inc_fields in updates:
+        update = {'$set': {**set_fields, 'updatedAt': now}}
+        if inc_fields:
+            update['$inc'] = inc_fields
+        operations.append(UpdateOne({'_id': product_id, **(NOT_SPLIT if 'stock' in set_fields else {})}, update))
+
+    result = await get_collection(Product).bulk_write(operations, ordered=False)
+
+    not_found = []
+    split = []
+    if result.matched_count < len(operations):
+        ids = list({product_id for product_id, _, _ in updates})
+        cursor = get_collection(Product).find({'_id': {'$in': ids}}, {'stockShards': 1})
+        existing = {document['_id']: document.get('stockShards') for document in await cursor.to_list(length=None)}
+        not_found = [str(product_id) for product_id in ids if product_id not in existing]
+        split = list(dict.fromkeys(
+            str(product_id) for product_id, set_fields, _ in updates if 'stock' in set_fields and existing.get(product_id)
+        ))
+
+    return {
+        'matched': result.matched_count,
+        'modified': result.modified_count,
+        'not_found': not_found,
+        'split': split
+    }
+
+
+async def delete_product(product_id: str) -> int:
+    deleted = await delete_documents(Product, {'_id': ObjectId(product_id)})
+    if deleted:
+        await delete_documents(StockShard, {'product_id': ObjectId(product_id)})
+    return deleted
+
+
+async def bulk_upsert_products(rows: List[Tuple[int, Product]]) -> Dict[str, Any]:
+    """
+    Upsert a batch of (row number, product) pairs by sku in one unordered bulk_write.
+    Products whose stock is split into shards are rejected: overwriting their stock would
+    orphan the units held in the shards, so they must be merged back first.
+    Returns the write counts and the row numbers that failed with their error messages.
+    """
+    cursor = get_collection(Product).find(
+        {'sku': {'$in': [product.sku for _, product in rows]}, 'stockShards': {'$gt': 0}},
+        {'sku': 1}
+    )
+    split_skus = {document['sku'] for document in await cursor.to_list(length=None)}
+
+    now = datetime.datetime.utcnow()
+    operations = []
+    written_rows = []
+    errors = []
+    for row, product in rows:
+        if product.sku in split_skus:
+            errors.append((row, f"sku {product.sku}: stock is split into shards, merge them before importing"))
+            continue
+        fields = product.to_mongo().to_dict()
+        fields.pop('createdAt', None)
+        fields.pop('stockShards', None)
+        fields['updatedAt'] = now
+        # NOT_SPLIT makes a product split since the check above fail the upsert on the unique sku
+        # instead of overwriting its stock
+        operations.append(UpdateOne(
+            {'sku': product.sku, **NOT_SPLIT},
+            {'$set': fields, '$setOnInsert': {'createdAt': now, 'stockShards': 0}},
+            upsert=True
+        ))
+        written_rows.append(row)
+
+    result = {'nUpserted': 0, 'nModified': 0, 'nMatched': 0, 'writeErrors': []}
+    if operations:
+        try:
+            result = (await get_collection(Product).bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+
+    errors.extend((written_rows[error['index']], error['errmsg']) for error in result['writeErrors'])
+    return {
+        'upserted': result['nUpserted'],
+        'modified': result['nModified'],
+        'matched': result['nMatched'],
+        'errors': sorted(errors)
+    }
@@ -0,0 +1,39 @@
+import datetime
+from typing import Any, Dict, List
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.models.token import TokenRevocation
+from app.models.user import User
+from app.crud.base import insert_document
+from app.database import get_collection
+
+
+async def get_active_revocations() -> List[Dict[str, Any]]:
+    cursor = get_collection(TokenRevocation).find(
+        {'expiresAt': {'$gt': datetime.datetime.utcnow()}},
+        {'_id': 0, 'jti': 1, 'user_id': 1, 'tokenVersion': 1}
+    )
+    return await cursor.to_list(length=None)
+
+
+async def revoke_token(user_id: str, jti: str, expires_at: datetime.datetime) -> TokenRevocation:
+    return await insert_document(TokenRevocation(jti=jti, user_id=ObjectId(user_id), expiresAt=expires_at))
+
+
+async def revoke_user_tokens(user_id: str, expires_at: datetime.datetime) -> int:
+    """
+    Bump the user's token version so every token issued before now is rejected.
+    Returns the new version.
+    """
+    user = await get_collection(User).find_one_and_update(
+        {'_id': ObjectId(user_id)},
+        {'$inc': {'tokenVersion': 1}, '$set': {'updatedAt': datetime.datetime.utcnow()}},
+        projection={'tokenVersion': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    await insert_document(TokenRevocation(
+        user_id=ObjectId(user_id),
+        tokenVersion=user['tokenVersion'],
+        expiresAt=expires_at
+    ))
+    return user['tokenVersion']
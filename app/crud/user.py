@@ -0,0 +1,30 @@
+import datetime
+from typing import Optional
+from bson import ObjectId
+from pydantic import EmailStr
+from app.models.user import User
+from app.crud.base import insert_document, find_document
+from app.database import get_collection
+
+
+async def check_user_exists(email: EmailStr) -> bool:
+    return await get_collection(User).count_documents({'email': email}, limit=1) > 0
+
+
+async def get_user_by_email(email: EmailStr) -> Optional[User]:
+    return await find_document(User, {'email': email})
+
+
+async def get_user_by_id(user_id: str) -> Optional[User]:
+    return await find_document(User, {'_id': ObjectId(user_id)})
+
+
+async def create_user(user: User) -> User:
+    return await insert_document(user)
+
+
+async def update_user_password(user_id, hashed_password: str):
+    await get_collection(User).update_one(
+        {'_id': ObjectId(user_id)},
+        {'$set': {'password': hashed_password, 'updatedAt': datetime.datetime.utcnow()}}
+    )
@@ -1,9 +1,45 @@
-import mongoengine
+from typing import Type
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from mongoengine import Document
+from pymongo.errors import PyMongoError
 from app.settings import settings
+from app.metrics import command_metrics_listener
+from app.timing import request_timing_listener
+
+
+class Database:
+    client: AsyncIOMotorClient = None
+    db: AsyncIOMotorDatabase = None
+    # Replica sets and sharded clusters support change streams and multi-document transactions
+    is_replica_set: bool = False
+
+database = Database()
 
 async def connect_db():
-    mongoengine.connect(host=settings.MONGODB_URI)
+    event_listeners = []
+    if settings.METRICS_ENABLED:
+        event_listeners.append(command_metrics_listener)
+    if settings.SERVER_TIMING_ENABLED:
+        event_listeners.append(request_timing_listener)
+    database.client = AsyncIOMotorClient(host=settings.MONGODB_URI, event_listeners=event_listeners)
+    database.db = database.client.get_default_database("test")
+    await database.client.admin.command("ping")
+    database.is_replica_set = await check_replica_set()
     print("DB Connected")
 
+async def check_replica_set() -> bool:
+    try:
+        hello = await database.client.admin.command("hello")
+    except (PyMongoError, NotImplementedError):
+        return False
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
 async def disconnect_db():
-    mongoengine.disconnect()
+    if database.client is not None:
+        database.client.close()
+        database.client = None
+        database.db = None
+
+def get_collection(document: Type[Document]) -> AsyncIOMotorCollection:
+    # The mongoengine models only describe the schema; all I/O goes through motor
+    return database.db[document._get_collection_name()]
@@ -6,7 +6,9 @@ from httplib2.error import ServerNotFoundError
 from starlette import status
 from starlette.exceptions import HTTPException
 from mongoengine.errors import NotUniqueError, ValidationError, OperationError
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from bson.errors import InvalidId
+from app.utils.password import PasswordHasherBusy
 
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
@@ -63,4 +65,31 @@ async def duplicate_key_error_handler(request: Request, exc: DuplicateKeyError):
     return JSONResponse(
         status_code=status.HTTP_400_BAD_REQUEST,
         content={"message": "Duplicate key error"}
+    )
+
+# Malformed ObjectId in a path or token
+async def invalid_id_handler(request: Request, exc: InvalidId):
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"message": "Invalid id"}
+    )
+
+
+# Password hashing pool saturated
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"message": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+
+# MongoDB operation ran past the request deadline (or the server is unreachable in time)
+async def database_timeout_handler(request: Request, exc: PyMongoError):
+    if not exc.timeout:
+        return await general_exception_handler(request, exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"message": "The database is slow to respond, please retry shortly"},
+        headers={"Retry-After": "1"}
     )
\ No newline at end of file
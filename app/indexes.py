@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+from bson import ObjectId
+from mongoengine import Document
+from pymongo.errors import OperationFailure
+from app.settings import settings
+from app.database import connect_db, disconnect_db, get_collection
+from app.models.user import User
+from app.models.product import Product
+from app.models.cart import CartItem
+from app.models.token import TokenRevocation
+from app.models.order import Order
+from app.models.inventory import StockShard
+from app.crud.cart import merge_duplicate_cart_items
+from app.crud.product import build_search_query, find_search_products
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS = (User, Product, CartItem, TokenRevocation, Order, StockShard)
+
+IndexKey = Tuple[Tuple[str, Any], ...]
+
+
+@dataclass
+class IndexReport:
+    collection: str
+    created: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    # Declared indexes the server refused to build, with its reason
+    failed: List[str] = field(default_factory=list)
+    undeclared: List[str] = field(default_factory=list)
+    redundant: List[str] = field(default_factory=list)
+    unused: List[str] = field(default_factory=list)
+
+
+def normalize_key(key) -> IndexKey:
+    """
+    Bring a declared index spec and an index reported by the server to the same shape.
+    The server stores all text fields of a text index as the pair (_fts, _ftsx).
+    """
+    normalized = []
+    has_text = False
+    for name, direction in key:
+        if direction == 'text' or name in ('_fts', '_ftsx'):
+            if not has_text:
+                normalized += [('_fts', 'text'), ('_ftsx', 1)]
+                has_text = True
+            continue
+        normalized.append((name, int(direction) if isinstance(direction, (int, float)) else direction))
+    return tuple(normalized)
+
+
+def format_key(key: IndexKey) -> str:
+    return ', '.join(f'{name}: {direction}' for name, direction in key)
+
+
+async def get_unused_indexes(document: Type[Document]) -> List[str]:
+    # $indexStats counts accesses since the server last started; not available on every deployment
+    try:
+        cursor = get_collection(document).aggregate([{'$indexStats': {}}])
+        stats = await cursor.to_list(length=None)
+    except (OperationFailure, NotImplementedError):
+        return []
+    return [stat['name'] for stat in stats if stat['name'] != '_id_' and stat['accesses']['ops'] == 0]
+
+
+async def reconcile_indexes(document: Type[Document], create_missing: bool = True) -> IndexReport:
+    collection = get_collection(document)
+    report = IndexReport(collection=collection.name)
+
+    existing = await collection.index_information()
+    existing_keys: Dict[IndexKey, str] = {normalize_key(info['key']): name for name, info in existing.items()}
+    unique_keys = {normalize_key(info['key']) for info in existing.values() if info.get('unique')}
+
+    declared_keys = set()
+    for spec in document._meta['index_specs']:
+        key = normalize_key(spec['fields'])
+        declared_keys.add(key)
+        if key in existing_keys:
+            continue
+
+        if not create_missing:
+            report.missing.append(format_key(key))
+            continue
+
+        options = {name: value for name, value in spec.items() if name not in ('fields', 'cls')}
+        try:
+            name = await collection.create_index(spec['fields'], background=True, **options)
+        except OperationFailure as e:
+            # e.g. a unique index over existing duplicates; the other indexes are still built
+            report.failed.append(f"{format_key(key)} ({e})")
+            continue
+        existing_keys[key] = name
+        report.created.append(name)
+
+    for key, name in existing_keys.items():
+        if name == '_id_':
+            continue
+        if key not in declared_keys:
+            report.undeclared.append(name)
+        # A non-unique index is redundant when another index starts with the same fields
+        if key not in unique_keys and any(other != key and other[:len(key)] == key for other in existing_keys):
+            report.redundant.append(name)
+
+    report.unused = await get_unused_indexes(document)
+    return report
+
+
+async def reconcile_all_indexes(create_missing: bool = True) -> List[IndexReport]:
+    reports = [await reconcile_indexes(document, create_missing) for document in DOCUMENTS]
+
+    for report in reports:
+        if report.created:
+            logger.warning("Created indexes on %s: %s", report.collection, ", ".join(report.created))
+        if report.failed:
+            logger.error("Failed to create indexes on %s: %s", report.collection, "; ".join(report.failed))
+        if report.missing:
+            logger.warning("Missing indexes on %s: %s", report.collection, "; ".join(report.missing))
+        if report.undeclared:
+            logger.warning("Undeclared indexes on %s: %s", report.collection, ", ".join(report.undeclared))
+        if report.redundant:
+            logger.warning("Redundant indexes on %s: %s", report.collection, ", ".join(report.redundant))
+        if report.unused:
+            logger.warning("Unused indexes on %s: %s", report.collection, ", ".join(report.unused))
+
+    return reports
+
+
+async def run_index_reconciliation(create_missing: bool = True):
+    # Started at startup without being awaited: builds over large collections take minutes,
+    # and workers serve with the indexes that already exist in the meantime
+    try:
+        await reconcile_all_indexes(create_missing)
+    except Exception as e:
+        logger.error("Index reconciliation failed: %s", e)
+
+
+def search_combinations() -> Iterator[Dict[str, Any]]:
+    """
+    Every filter and sort combination the product search accepts, first page and later pages.
+    """
+    price_ranges = ((None, None), (10.0, None), (None, 100.0), (10.0, 100.0))
+    for q, (min_price, max_price), in_stock in itertools.product((None, 'lamp'), price_ranges, (False, True)):
+        for sort in ('newest', 'price_asc', 'price_desc', 'relevance'):
+            if sort == 'relevance':
+                if q:
+                    yield dict(q=q, min_price=min_price, max_price=max_price, in_stock=in_stock, sort=sort, after=None)
+                continue
+            after_value = datetime.datetime.utcnow() if sort == 'newest' else 50.0
+            for after in (None, (after_value, ObjectId())):
+                yield dict(q=q, min_price=min_price, max_price=max_price, in_stock=in_stock, sort=sort, after=after)
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan['stage']] if 'stage' in plan else []
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        stages += plan_stages(child)
+    return stages
+
+
+def plan_problem(combination: Dict[str, Any], explain: Dict[str, Any]) -> Optional[str]:
+    """
+    What makes an explained search unbounded, or None when its cost tracks the page size.
+    A text search fetches its matches before the other filters apply, so it is only held to
+    avoiding a collection scan; every other search must read just the documents it returns,
+    in index order.
+    """
+    stages = plan_stages(explain['queryPlanner']['winningPlan'])
+    if 'COLLSCAN' in stages:
+        return f"collection scan: {' > '.join(stages)}"
+    if combination['q']:
+        return None
+    if 'SORT' in stages:
+        return f"in-memory sort: {' > '.join(stages)}"
+    stats = explain['executionStats']
+    if stats['totalDocsExamined'] > stats['nReturned']:
+        return f"examined {stats['totalDocsExamined']} documents for {stats['nReturned']} results: {' > '.join(stages)}"
+    return None
+
+
+async def check_search_plans() -> List[Tuple[Dict[str, Any], str]]:
+    """
+    Explain every product search combination against the current data and return those whose
+    winning plan is unbounded, with the reason.
+    """
+    problems = []
+    for combination in search_combinations():
+        query, order = build_search_query(**combination)
+        # explain() defaults to allPlansExecution verbosity, so executionStats is included
+        explain = await find_search_products(query, order, limit=20).explain()
+        problem = plan_problem(combination, explain)
+        if problem:
+            problems.append((combination, problem))
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Reconcile declared indexes and check the product search plans")
+    parser.add_argument(
+        "--merge-duplicate-cart-items", action="store_true",
+        help="fold cart items that repeat a (user_id, product_id) pair into one first, so the unique index can be built"
+    )
+    args = parser.parse_args()
+
+    await connect_db()
+    try:
+        if args.merge_duplicate_cart_items:
+            print(f"Merged away {await merge_duplicate_cart_items()} duplicate cart items")
+        for report in await reconcile_all_indexes(create_missing=settings.AUTO_CREATE_INDEXES):
+            print(report)
+        try:
+            problems = await check_search_plans()
+        except (OperationFailure, NotImplementedError) as e:
+            print(f"Search plan check unavailable: {e}")
+        else:
+            for combination, problem in problems:
+                print(f"Search not index-bounded: {combination} -> {problem}")
+            if not problems:
+                print("Every product search combination is index-bounded")
+    finally:
+        await disconnect_db()
+
+
+# python -m app.indexes
+if __name__ == "__main__":
+    asyncio.run(main())
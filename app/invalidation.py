@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Type
+from mongoengine import Document
+from pymongo.errors import OperationFailure, PyMongoError
+from app.database import database, get_collection
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Called with the changed document's id as a string, or None when the change can't be pinned to one document
+InvalidationHandler = Callable[[Optional[str]], None]
+
+
+class InvalidationBus:
+    """
+    Fans out changes made by any worker to the in-process caches of this one.
+    Tails a change stream per watched collection; on deployments without change streams
+    (standalone servers, mongomock) it polls updatedAt and the document count instead.
+    Polling relies on the writers' clocks and an updatedAt index on every watched collection,
+    so it is meant for development and single-node setups.
+    """
+    def __init__(self, poll_interval: float, poll_overlap: float = 5.0):
+        self.poll_interval = poll_interval
+        # Re-read a few seconds before the newest updatedAt seen, to absorb clock skew between writers
+        self.poll_overlap = datetime.timedelta(seconds=poll_overlap)
+        self.mode: Optional[str] = None
+        self._handlers: Dict[Type[Document], List[InvalidationHandler]] = defaultdict(list)
+        self._tasks: List[asyncio.Task] = []
+
+    def subscribe(self, document: Type[Document], handler: InvalidationHandler):
+        self._handlers[document].append(handler)
+
+    def publish(self, document: Type[Document], document_id: Optional[str]):
+        for handler in self._handlers[document]:
+            handler(document_id)
+
+    async def start(self):
+        self.mode = "change_stream" if database.is_replica_set else "polling"
+        for document in self._handlers:
+            if self.mode == "change_stream":
+                task = asyncio.create_task(self._watch(document))
+            else:
+                task = asyncio.create_task(self._poll(document))
+            self._tasks.append(task)
+        logger.info("Cache invalidation started (%s)", self.mode)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _watch(self, document: Type[Document]):
+        collection = get_collection(document)
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        resume_token = None
+        while True:
+            try:
+                async with collection.watch(pipeline, resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self.publish(document, str(change["documentKey"]["_id"]))
+            except OperationFailure as e:
+                logger.warning("Change stream on %s unavailable, polling instead: %s", collection.name, e)
+                await self._poll(document)
+                return
+            except PyMongoError as e:
+                # Transient failure; resume where the stream left off
+                logger.warning("Change stream on %s interrupted: %s", collection.name, e)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self, document: Type[Document]):
+        collection = get_collection(document)
+        last_seen = datetime.datetime.utcnow()
+        last_count = None
+        # id -> updatedAt already published, so the overlap window doesn't re-publish the same write
+        published: Dict[str, datetime.datetime] = {}
+        while True:
+            try:
+                since = last_seen - self.poll_overlap
+                cursor = collection.find({"updatedAt": {"$gt": since}}, {"updatedAt": 1})
+                for changed in await cursor.to_list(length=None):
+                    document_id = str(changed["_id"])
+                    if published.get(document_id) == changed["updatedAt"]:
+                        continue
+                    published[document_id] = changed["updatedAt"]
+                    last_seen = max(last_seen, changed["updatedAt"])
+                    self.publish(document, document_id)
+                published = {key: value for key, value in published.items() if value > since}
+
+                # Deletions leave no updatedAt behind; a changed count is the only trace
+                count = await collection.estimated_document_count()
+                if last_count is not None and count < last_count:
+                    self.publish(document, None)
+                last_count = count
+            except PyMongoError as e:
+                logger.warning("Polling %s failed: %s", collection.name, e)
+            await asyncio.sleep(self.poll_interval)
+
+
+invalidation_bus = InvalidationBus(poll_interval=settings.CACHE_INVALIDATION_POLL_SECONDS)
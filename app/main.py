@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,11 +6,22 @@ from google.auth.exceptions import RefreshError
 from httplib2.error import ServerNotFoundError
 from starlette.exceptions import HTTPException
 from mongoengine.errors import NotUniqueError, ValidationError, OperationError
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from bson.errors import InvalidId
 
 from app.constants import constants
-from app.routers import user, product, cart
+from app.routers import user, product, cart, order, metrics
 from app.database import connect_db, disconnect_db
+from app.indexes import run_index_reconciliation
+from app.settings import settings
+from app.security import token_denylist
+from app.invalidation import invalidation_bus
+from app.reservations import run_reservation_expiry
+from app.cart_buffer import cart_buffer
+from app.metrics import MetricsMiddleware
+from app.timing import ServerTimingMiddleware
+from app.admission import AdmissionMiddleware
+from app.utils.password import PasswordHasherBusy, password_hasher
 from app.exceptions import (
     http_exception_handler,
     validation_exception_handler,
@@ -19,21 +31,42 @@ from app.exceptions import (
     validation_error_handler,
     operation_error_handler,
     general_exception_handler,
-    duplicate_key_error_handler
+    duplicate_key_error_handler,
+    invalid_id_handler,
+    password_hasher_busy_handler,
+    database_timeout_handler
 )
 
 # Define the lifespan context function
 async def lifespan_context(app: FastAPI):
     # Startup
     await connect_db()
+    index_task = asyncio.create_task(run_index_reconciliation(create_missing=settings.AUTO_CREATE_INDEXES))
+    await token_denylist.refresh()
+    denylist_task = asyncio.create_task(token_denylist.run(settings.TOKEN_DENYLIST_REFRESH_SECONDS))
+    await invalidation_bus.start()
+    reservation_task = asyncio.create_task(run_reservation_expiry(settings.RESERVATION_SWEEP_SECONDS))
+    if settings.CART_WRITE_BEHIND:
+        cart_buffer.start()
     yield
     # Shutdown
+    await cart_buffer.stop()
+    await invalidation_bus.stop()
+    # Waited for, so none of them is still using the client when it closes; a release cut short
+    # by the cancel is finished by the next sweep
+    tasks = (reservation_task, denylist_task, index_task)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
     await disconnect_db()
+    password_hasher.shutdown()
 
 # Create the FastAPI app instance
 app = FastAPI(lifespan=lifespan_context)
 
-# Middleware
+# Middleware (the last one added runs first)
+# Inside CORS, so shed requests still carry the CORS headers the browser needs to read the 503
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=constants.ALLOWED_HOSTS,
@@ -41,11 +74,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(user.router)
 app.include_router(product.router)
 app.include_router(cart.router)
+app.include_router(order.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 
 # Exception handlers
 app.add_exception_handler(HTTPException, http_exception_handler)
@@ -57,6 +97,9 @@ app.add_exception_handler(ValidationError, validation_error_handler)
 app.add_exception_handler(OperationError, operation_error_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 app.add_exception_handler(DuplicateKeyError, duplicate_key_error_handler)
+app.add_exception_handler(InvalidId, invalid_id_handler)
+app.add_exception_handler(PasswordHasherBusy, password_hasher_busy_handler)
+app.add_exception_handler(PyMongoError, database_timeout_handler)
 
 
 if __name__ == "__main__":
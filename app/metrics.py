@@ -0,0 +1,91 @@
+import time
+from typing import Dict, Tuple
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.routing import route_template
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ["method", "route"]
+)
+MONGO_COMMANDS = Counter(
+    "mongo_commands_total",
+    "MongoDB commands by collection, command and outcome",
+    ["collection", "command", "outcome"]
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, count and in-flight requests per route template.
+    A plain ASGI middleware, so streamed responses aren't buffered and the hot path
+    costs one route match and a few label lookups. Paths that match no route share
+    the "unmatched" label to keep the series count bounded.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+            in_flight.dec()
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Counts and times every MongoDB command. The collection is only named in the
+    started event, so it is kept by request id until the command finishes.
+    """
+    def __init__(self):
+        self._collections: Dict[Tuple[int, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        target = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        self._collections[(event.request_id, event.operation_id)] = target if isinstance(target, str) else ""
+
+    def _finished(self, event, outcome: str):
+        collection = self._collections.pop((event.request_id, event.operation_id), "")
+        MONGO_COMMANDS.labels(collection, event.command_name, outcome).inc()
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event, "failure")
+
+
+command_metrics_listener = CommandMetricsListener()
@@ -12,5 +12,9 @@ class CartItem(Document):
     updatedAt = fields.DateTimeField(default=datetime.datetime.utcnow, auto_now=True)  
 
     meta = {
-        'collection': 'cart_items'
+        'collection': 'cart_items',
+        'indexes': [
+            # The user_id prefix also serves every per-user cart query
+            {'fields': ['user_id', 'product_id'], 'unique': True}
+        ]
     }
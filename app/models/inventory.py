@@ -0,0 +1,15 @@
+from mongoengine import Document, fields
+
+
+class StockShard(Document):
+    # One slice of a hot product's stock, so concurrent reservations spread over several documents
+    product_id = fields.ObjectIdField(required=True)
+    shard = fields.IntField(required=True)
+    stock = fields.IntField(default=0)
+
+    meta = {
+        'collection': 'stock_shards',
+        'indexes': [
+            {'fields': ['product_id', 'shard'], 'unique': True}
+        ]
+    }
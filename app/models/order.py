@@ -0,0 +1,46 @@
+from mongoengine import Document, EmbeddedDocument, fields
+import datetime
+from app.models.user import User
+
+# releasing: cancelled or expired, with stock still being given back (see app.reservations.release_order)
+ORDER_STATUSES = ('reserved', 'releasing', 'completed', 'cancelled', 'expired')
+RELEASE_STATUSES = ('cancelled', 'expired')
+
+
+class StockTake(EmbeddedDocument):
+    # StockShard the units were taken from, None for the product's own stock
+    shard = fields.IntField(null=True)
+    quantity = fields.IntField(required=True, min_value=1)
+    # Set once the units are back in stock, so a retried release skips them
+    released = fields.BooleanField(default=False)
+
+
+class OrderItem(EmbeddedDocument):
+    product_id = fields.ObjectIdField(required=True)
+    name = fields.StringField()
+    price = fields.FloatField(required=True)
+    quantity = fields.IntField(required=True, min_value=1)
+    # Where the reserved quantity came from; a split product may spread it over several shards
+    takes = fields.ListField(fields.EmbeddedDocumentField(StockTake))
+
+
+class Order(Document):
+    user_id = fields.ReferenceField(User, required=True)
+    items = fields.ListField(fields.EmbeddedDocumentField(OrderItem))
+    total = fields.FloatField(required=True)
+    status = fields.StringField(choices=ORDER_STATUSES, default='reserved')
+    # Status a releasing order ends up in
+    releaseTo = fields.StringField(choices=RELEASE_STATUSES)
+    # Reserved stock is released if the order isn't completed by then
+    expiresAt = fields.DateTimeField(required=True)
+    createdAt = fields.DateTimeField(default=datetime.datetime.utcnow)
+    updatedAt = fields.DateTimeField(default=datetime.datetime.utcnow, auto_now=True)
+
+    meta = {
+        'collection': 'orders',
+        'indexes': [
+            {'fields': ['user_id', '-createdAt']},
+            # The expiry sweep looks for reserved orders past expiresAt
+            {'fields': ['status', 'expiresAt']}
+        ]
+    }
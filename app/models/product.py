@@ -2,15 +2,30 @@ from mongoengine import Document, fields
 import datetime
 
 class Product(Document):
+    # Supplier-facing key that bulk imports upsert on
+    sku = fields.StringField(max_length=64)
     name = fields.StringField(max_length=255, required=True)
     description = fields.StringField()
     price = fields.FloatField(required=True)
     stock = fields.IntField(required=True)
+    # Number of StockShard counters holding part of the stock for hot products, 0 when not split
+    stockShards = fields.IntField(default=0)
     createdAt = fields.DateTimeField(default=datetime.datetime.utcnow)
     updatedAt = fields.DateTimeField(default=datetime.datetime.utcnow, auto_now=True)  
 
 
     meta = {
-        'collection': 'products'
+        'collection': 'products',
+        'indexes': [
+            # Newest-first listing with _id as the tiebreaker; the trailing keys let searches
+            # filter on price and stock from the index without fetching documents
+            {'fields': ['-createdAt', '-_id', 'price', 'stock', 'stockShards']},
+            {'fields': ['sku'], 'unique': True, 'sparse': True},
+            # Search: full-text match on name and description, and price-ordered browsing
+            {'fields': ['$name', '$description'], 'weights': {'name': 10, 'description': 2}, 'default_language': 'english'},
+            {'fields': ['price', '_id', 'stock', 'stockShards']},
+            # Cache invalidation polls for recent writes where change streams aren't available
+            {'fields': ['updatedAt']}
+        ]
     }
 
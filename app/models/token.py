@@ -0,0 +1,17 @@
+from mongoengine import Document, fields
+
+
+class TokenRevocation(Document):
+    # Either a single token (jti) or every token of a user below tokenVersion
+    jti = fields.StringField()
+    user_id = fields.ObjectIdField(required=True)
+    tokenVersion = fields.IntField()
+    expiresAt = fields.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'token_revocations',
+        'indexes': [
+            # MongoDB drops a revocation once every token it covers has expired
+            {'fields': ['expiresAt'], 'expireAfterSeconds': 0}
+        ]
+    }
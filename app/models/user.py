@@ -1,8 +1,8 @@
 from mongoengine import Document, fields
 import datetime
+from typing import Optional, Tuple
 from passlib.context import CryptContext
-from pydantic import EmailStr
-from mongoengine.errors import DoesNotExist
+from app.utils.password import password_hasher
 
 
 
@@ -11,28 +11,25 @@ class User(Document):
     email = fields.EmailField(unique=True, required=True)
     password = fields.StringField(required=True)
     dob = fields.DateField(required=True)
+    # Tokens carrying a lower version have been revoked
+    tokenVersion = fields.IntField(default=0)
     createdAt = fields.DateTimeField(default=datetime.datetime.utcnow)
     updatedAt = fields.DateTimeField(default=datetime.datetime.utcnow, auto_now=True)  
 
 
     meta = {
-        'collection': 'users'
+        'collection': 'users',
+        'indexes': [
+            # Cache invalidation polls for recent writes where change streams aren't available
+            {'fields': ['updatedAt']}
+        ]
     }
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def check_user_exists(email: EmailStr) -> bool:
-    return User.objects(email=email).first() is not None
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_user_by_email(email: EmailStr):
-    try:
-        return User.objects.get(email=email)
-    except DoesNotExist:
-        return None
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(pwd_context.hash, password)
 
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # Returns a replacement hash when the stored one uses outdated CryptContext parameters
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+import logging
+from typing import Any, Dict, List
+from app.models.product import Product
+from app.crud import inventory as inventory_crud
+from app.crud import order as order_crud
+from app.invalidation import invalidation_bus
+from app.utils.background import run_detached
+
+logger = logging.getLogger(__name__)
+
+# A release with no progress for this long is assumed abandoned and taken over by the sweeper
+RELEASE_LEASE = datetime.timedelta(seconds=60)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id: str, name: str):
+        super().__init__(f"Insufficient stock for {name}")
+        self.product_id = product_id
+
+
+async def reserve_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Reserve every item concurrently. If any of them can't be reserved, the ones that were
+    are released again before InsufficientStock is raised, so a failed checkout holds no stock.
+    Args:
+        items (list): Dicts with product_id, name, quantity and the product's stockShards.
+    Returns:
+        list: The items, each with the takes its quantity came from.
+    """
+    results = await asyncio.gather(
+        *(inventory_crud.reserve_stock(item['product_id'], item['quantity'], item.get('stockShards') or 0) for item in items),
+        return_exceptions=True
+    )
+
+    reserved = []
+    failed = None
+    for item, result in zip(items, results):
+        if isinstance(result, BaseException):
+            failed = failed or result
+        elif result is not None:
+            reserved.append({**item, 'takes': result})
+        else:
+            failed = failed or InsufficientStock(str(item['product_id']), item['name'])
+
+    if failed is not None:
+        await release_items(reserved)
+        raise failed
+
+    for item in reserved:
+        invalidation_bus.publish(Product, str(item['product_id']))
+    return reserved
+
+
+async def release_items(items: List[Dict[str, Any]]):
+    # Compensates a failed checkout, possibly one that ran out of request deadline, so it gets its own
+    await run_detached(_release_takes(items))
+    for item in items:
+        invalidation_bus.publish(Product, str(item['product_id']))
+
+
+async def _release_takes(items: List[Dict[str, Any]]):
+    await asyncio.gather(
+        *(inventory_crud.release_takes(item['product_id'], item['takes']) for item in items)
+    )
+
+
+async def release_order(order: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Give back the stock of a releasing order, then move it to its final status.
+    Each take is marked once it is back in stock, so a release that fails halfway can be retried
+    (by the sweeper, see expire_reservations) without returning any units twice.
+    Returns the order as finished.
+    """
+    for item_index, item in enumerate(order['items']):
+        for take_index, take in enumerate(item['takes']):
+            if take.get('released'):
+                continue
+            await inventory_crud.release_stock(item['product_id'], take['quantity'], take.get('shard'))
+            await order_crud.mark_take_released(order['_id'], item_index, take_index)
+        invalidation_bus.publish(Product, str(item['product_id']))
+    return await order_crud.finish_release(order) or order
+
+
+async def expire_reservations() -> int:
+    """
+    Release the stock of every reserved order past its expiry, and finish releases that stalled
+    because their request or worker failed midway. Each order is claimed with an atomic update
+    first, so concurrent sweepers never release it at the same time.
+    """
+    released = 0
+    while True:
+        now = datetime.datetime.utcnow()
+        order = await order_crud.claim_expired_order(now) or await order_crud.claim_stalled_release(now, now - RELEASE_LEASE)
+        if not order:
+            return released
+        await release_order(order)
+        released += 1
+
+
+async def run_reservation_expiry(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            released = await expire_reservations()
+            if released:
+                logger.info("Released stock of %d orders", released)
+        except Exception as e:
+            # Leave them for the next sweep
+            logger.warning("Reservation expiry failed: %s", e)
@@ -1,80 +1,130 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi.responses import ORJSONResponse
+from typing import List, Literal, Optional
 from bson import ObjectId
+from app.schemas.cart import CartItemCreate, CartItemResponse, CartItemExpandedResponse, CartSummary, CartBatch
+from app.security import user_authenticator, oauth2_scheme
 from app.models.cart import CartItem
-from app.schemas.cart import CartItemCreate, CartItemResponse
-from app.security import UserAuthenticator, oauth2_scheme
-from app.utils.formatting import cart_mongo_to_pydantic
+from app.models.product import Product
+from app.utils.formatting import get_serializer
+from app.crud import cart as cart_crud
+from app.settings import settings
+from app.cart_buffer import cart_buffer
 
 router = APIRouter()
-user_authenticator = UserAuthenticator()
+
+cart_item_serializer = get_serializer(CartItem, CartItemResponse)
+cart_item_expanded_serializer = get_serializer(CartItem, CartItemExpandedResponse, nested={'product': Product}, exclude_missing=True)
 
 # Add to cart (+1)
 @router.post("/api/users/{user_id}/cart", response_model=CartItemResponse, status_code=status.HTTP_201_CREATED)
 async def add_to_cart(user_id: str, cart_item: CartItemCreate, token: str = Depends(oauth2_scheme)):
-    user_authenticator.authenticate_user(token, user_id)
+    await user_authenticator.authenticate_user(token, user_id)
+
+    if settings.CART_WRITE_BEHIND:
+        pending = await cart_buffer.add(user_id, cart_item.product_id, 1)
+        return ORJSONResponse({"product_id": cart_item.product_id, "pending_quantity": pending}, status_code=status.HTTP_202_ACCEPTED)
+
+    updated_item = await cart_crud.increment_cart_item(user_id, cart_item.product_id)
+    return ORJSONResponse(cart_item_serializer.to_dict(updated_item), status_code=status.HTTP_201_CREATED)
+
+
+# Apply many add / set / remove operations at once and return the resulting cart
+@router.post("/api/users/{user_id}/cart/batch", response_model=List[CartItemResponse])
+async def batch_update_cart(user_id: str, batch: CartBatch, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+
+    operations = []
+    for operation in batch.operations:
+        if operation.op == "add" and operation.quantity < 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="add quantity must be at least 1"
+            )
+        operations.append((operation.op, ObjectId(operation.product_id), operation.quantity))
 
-    existing_item = CartItem.objects(user_id=ObjectId(user_id), product_id=cart_item.product_id).first()
-    if existing_item:
-        existing_item.quantity += 1
-        existing_item.save()
-        return cart_mongo_to_pydantic(existing_item, CartItemResponse)
+    # Earlier buffered clicks must land before the batch, not after it
+    await cart_buffer.flush_user(user_id)
+    await cart_crud.apply_cart_operations(user_id, operations)
 
-    new_cart_item = CartItem(
-        user_id=ObjectId(user_id),
-        product_id=cart_item.product_id,
-        quantity=1
-    )
-    new_cart_item.save()
-    return cart_mongo_to_pydantic(new_cart_item, CartItemResponse)
+    cart_items = await cart_crud.get_cart_items(user_id)
+    return ORJSONResponse(cart_item_serializer.many(cart_items))
 
 
-# Get all cart items
-@router.get("/api/users/{user_id}/cart", response_model=List[CartItemResponse])
-async def get_cart(user_id: str, token: str = Depends(oauth2_scheme)):
-    user_authenticator.authenticate_user(token, user_id)
+# Get all cart items (?expand=product joins name, price and stock)
+@router.get("/api/users/{user_id}/cart", response_model=List[CartItemExpandedResponse])
+async def get_cart(user_id: str, expand: Optional[Literal["product"]] = None, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+    await cart_buffer.flush_user(user_id)
+
+    if expand == "product":
+        cart_items = await cart_crud.get_cart_items_with_products(user_id)
+    else:
+        cart_items = await cart_crud.get_cart_items(user_id)
 
-    cart_items = CartItem.objects(user_id=ObjectId(user_id))
     if not cart_items:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No items in the cart."
         )
 
-    return [cart_mongo_to_pydantic(item, CartItemResponse) for item in cart_items]
+    return ORJSONResponse(cart_item_expanded_serializer.many(cart_items))
+
+# Cart badge: item count, subtotal and out of stock products in one round trip
+@router.get("/api/users/{user_id}/cart/summary", response_model=CartSummary)
+async def get_cart_summary(user_id: str, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+    await cart_buffer.flush_user(user_id)
+
+    summary = await cart_crud.get_cart_summary(user_id)
+    if not summary:
+        return ORJSONResponse({"items": 0, "quantity": 0, "subtotal": 0.0, "out_of_stock": []})
+
+    return ORJSONResponse({
+        "items": summary["items"],
+        "quantity": summary["quantity"],
+        "subtotal": round(summary["subtotal"], 2),
+        "out_of_stock": [str(product_id) for product_id in summary["out_of_stock"]]
+    })
 
 # Remove whole item from cart
 @router.delete("/api/users/{user_id}/cart/{cart_item_id}", status_code=status.HTTP_200_OK)
 async def remove_from_cart(user_id: str, cart_item_id: str, token: str = Depends(oauth2_scheme)):
-    user_authenticator.authenticate_user(token, user_id)
+    await user_authenticator.authenticate_user(token, user_id)
+    await cart_buffer.flush_user(user_id)
 
-    cart_item = CartItem.objects(id=ObjectId(cart_item_id), user_id=ObjectId(user_id)).first()
-    if not cart_item:
+    result = await cart_crud.delete_cart_item(user_id, cart_item_id)
+    if result == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cart item not found"
         )
 
-    cart_item.delete()
     return {"message": "Cart item removed successfully"}
 
 
 # Reduce quantity of cart item (-1) and remove whole item if quantity reaches 0
 @router.patch("/api/users/{user_id}/cart/{product_id}/reduce", status_code=status.HTTP_200_OK)
 async def reduce_cart_item_quantity(user_id: str, product_id: str, token: str = Depends(oauth2_scheme)):
-    user_authenticator.authenticate_user(token, user_id)
-
-    cart_item = CartItem.objects(user_id=ObjectId(user_id), product_id=ObjectId(product_id)).first()
+    await user_authenticator.authenticate_user(token, user_id)
+
+    if settings.CART_WRITE_BEHIND:
+        pending = await cart_buffer.add(user_id, product_id, -1)
+        if pending is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cart item not found"
+            )
+        return ORJSONResponse({"product_id": product_id, "pending_quantity": pending}, status_code=status.HTTP_202_ACCEPTED)
+
+    cart_item, removed = await cart_crud.decrement_cart_item(user_id, product_id)
     if not cart_item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cart item not found"
         )
 
-    cart_item.quantity -= 1
-    if cart_item.quantity <= 0:
-        cart_item.delete()
+    if removed:
         return {"message": "Cart item removed successfully because quantity reached 0"}
 
-    cart_item.save()
-    return cart_mongo_to_pydantic(cart_item, CartItemResponse)
+    return ORJSONResponse(cart_item_serializer.to_dict(cart_item))
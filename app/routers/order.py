@@ -0,0 +1,150 @@
+import datetime
+from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import ORJSONResponse
+from app.schemas.order import OrderResponse
+from app.security import user_authenticator, oauth2_scheme
+from app.models.order import Order, OrderItem, StockTake
+from app.utils.formatting import get_serializer
+from app.settings import settings
+from app.reservations import InsufficientStock, reserve_items, release_items, release_order
+from app.cart_buffer import cart_buffer
+from app.crud import cart as cart_crud
+from app.crud import order as order_crud
+
+router = APIRouter()
+
+order_serializer = get_serializer(Order, OrderResponse, nested={'items': OrderItem})
+
+
+# Turn the cart into an order, reserving stock until it is confirmed or expires
+@router.post("/api/users/{user_id}/checkout", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
+async def checkout(user_id: str, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+    await cart_buffer.flush_user(user_id)
+
+    cart_items = await cart_crud.get_cart_items_with_products(user_id)
+    if not cart_items:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No items in the cart."
+        )
+
+    products = {}
+    for cart_item in cart_items:
+        product = cart_item.get('product')
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Product {cart_item['product_id']} is no longer available"
+            )
+        products[cart_item['_id']] = product
+
+    # Take the items out of the cart before reserving, so concurrent checkouts can't both order them
+    claimed = await cart_crud.claim_cart_items(user_id, list(products))
+    if len(claimed) < len(products):
+        await cart_crud.restore_cart_items(claimed)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The cart changed during checkout, please retry"
+        )
+
+    items = []
+    for cart_item in claimed:
+        product = products[cart_item['_id']]
+        items.append({
+            'product_id': product['_id'],
+            'name': product['name'],
+            'price': product['price'],
+            'quantity': cart_item['quantity'],
+            'stockShards': product.get('stockShards')
+        })
+
+    try:
+        reserved = await reserve_items(items)
+    except InsufficientStock as e:
+        await cart_crud.restore_cart_items(claimed)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception:
+        await cart_crud.restore_cart_items(claimed)
+        raise
+
+    order = Order(
+        user_id=user_id,
+        items=[
+            OrderItem(
+                **{field: item[field] for field in ('product_id', 'name', 'price', 'quantity')},
+                takes=[StockTake(**take) for take in item['takes']]
+            )
+            for item in reserved
+        ],
+        total=round(sum(item['price'] * item['quantity'] for item in reserved), 2),
+        expiresAt=datetime.datetime.utcnow() + datetime.timedelta(seconds=settings.RESERVATION_TTL_SECONDS)
+    )
+    try:
+        order = await order_crud.create_order(order)
+    except Exception:
+        await release_items(reserved)
+        await cart_crud.restore_cart_items(claimed)
+        raise
+
+    return ORJSONResponse(order_serializer.from_document(order), status_code=status.HTTP_201_CREATED)
+
+
+@router.get("/api/users/{user_id}/orders/{order_id}", response_model=OrderResponse)
+async def get_order(user_id: str, order_id: str, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+
+    order = await order_crud.get_order(user_id, order_id)
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
+
+    return ORJSONResponse(order_serializer.to_dict(order))
+
+
+# Keep the reserved stock; only possible before the reservation expires
+@router.post("/api/users/{user_id}/orders/{order_id}/confirm", response_model=OrderResponse)
+async def confirm_order(user_id: str, order_id: str, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+
+    order = await order_crud.transition_order(
+        user_id, order_id, 'completed', {'expiresAt': {'$gt': datetime.datetime.utcnow()}}
+    )
+    if not order:
+        await raise_not_reserved(user_id, order_id)
+
+    return ORJSONResponse(order_serializer.to_dict(order))
+
+
+# Give the reserved stock back
+@router.post("/api/users/{user_id}/orders/{order_id}/cancel", response_model=OrderResponse)
+async def cancel_order(user_id: str, order_id: str, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+
+    order = await order_crud.transition_order(user_id, order_id, 'releasing', values={'releaseTo': 'cancelled'})
+    if not order:
+        await raise_not_reserved(user_id, order_id)
+
+    # If this fails midway, the order stays releasing and the expiry sweeper finishes it
+    order = await release_order(order)
+    return ORJSONResponse(order_serializer.to_dict(order))
+
+
+async def raise_not_reserved(user_id: str, order_id: str):
+    order = await order_crud.get_order(user_id, order_id)
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
+    # Reserved but past expiresAt: the sweeper just hasn't released it yet
+    order_status = {'reserved': 'expired', 'releasing': order.get('releaseTo')}.get(order['status'], order['status'])
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Order is {order_status}"
+    )
@@ -1,64 +1,490 @@
-from fastapi import APIRouter, HTTPException, status
+import time
+import orjson
+from pydantic import ValidationError
+from mongoengine.errors import ValidationError as DocumentValidationError
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductResponse, ProductUpdate
-from typing import List
-from app.utils.formatting import format_mongo_to_pydantic
+from app.schemas.product import ProductCreate, ProductResponse, ProductUpdate, ProductListItem, ProductPage, ProductImportResult, ProductBatchUpdate, ProductBatchUpdateResult, ProductLookup, ProductLookupResult, ProductStockSplit, ProductStockResponse
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from cachetools import TTLCache
+from app.utils.formatting import get_serializer
+from app.utils.pagination import encode_cursor, decode_cursor, encode_sort_cursor, decode_sort_cursor
+from app.utils.export import stream_ndjson, stream_csv
+from app.utils.upload import UploadFormatError, iter_ndjson_rows, iter_json_array_rows
+from app.utils.cache import CachedResponse, ResponseCache, make_etag, to_http_date, is_not_modified
+from app.settings import settings
+from app.invalidation import invalidation_bus
+from app.crud import product as product_crud
+from app.crud import inventory as inventory_crud
 
 
 router = APIRouter()
 
+product_serializer = get_serializer(Product, ProductResponse)
+product_list_serializer = get_serializer(Product, ProductListItem, exclude_missing=True)
+
+# Pre-serialized listing pages; any product write clears it
+catalog_cache = ResponseCache(max_bytes=settings.CATALOG_CACHE_MAX_BYTES)
+# Serialized products by id for multi-get lookups; writes evict the product they touch
+product_cache: TTLCache = TTLCache(maxsize=settings.PRODUCT_CACHE_SIZE, ttl=settings.PRODUCT_CACHE_TTL)
+
+
+def invalidate_product_caches(product_id: Optional[str] = None):
+    """
+    Drop cached listing pages and the cached product. None evicts every cached product.
+    """
+    catalog_cache.clear()
+    if product_id is None:
+        product_cache.clear()
+    else:
+        product_cache.pop(product_id, None)
+
+
+invalidation_bus.subscribe(Product, invalidate_product_caches)
+
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+# Failed rows beyond this are counted but not listed
+MAX_IMPORT_ERRORS = 1000
+MAX_BATCH_UPDATES = 10000
+MAX_LOOKUP_IDS = 1000
+MAX_QUERY_LOOKUP_IDS = 100
+# Relevance-ordered search pages by offset, so it stops here
+MAX_RELEVANCE_RESULTS = 1000
+SPLIT_STOCK_MESSAGE = "Product stock is split into shards; merge them before setting stock, or use stock_delta"
+PRODUCT_LIST_FIELDS = {'sku', 'name', 'description', 'price', 'stock', 'createdAt', 'updatedAt'}
+
 @router.post("/api/products", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(product: ProductCreate):
 
     new_product = Product(
+        sku=product.sku,
         name=product.name,
         description=product.description,
         price=product.price,
         stock=product.stock,
     )
 
-    new_product.save()
+    new_product = await product_crud.create_product(new_product)
+    catalog_cache.clear()
     
-    return format_mongo_to_pydantic(new_product, ProductResponse)
+    return ORJSONResponse(product_serializer.from_document(new_product), status_code=status.HTTP_201_CREATED)
 
 
-@router.get("/api/products", response_model=List[ProductResponse], status_code=status.HTTP_200_OK)
-async def get_all_products():
+@router.get("/api/products", response_model=ProductPage, status_code=status.HTTP_200_OK)
+async def get_all_products(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. name,price")
+):
 
-    products = Product.objects()
-    
-    return [format_mongo_to_pydantic(product, ProductResponse) for product in products]
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    selected_fields = parse_fields(fields)
+
+    cache_key = (limit, after, tuple(selected_fields) if selected_fields else None)
+    page = await catalog_cache.get_or_build(cache_key, lambda: build_product_page(limit, after, selected_fields))
+
+    if is_not_modified(request.headers, page):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=page.headers())
+
+    return Response(page.body, media_type="application/json", headers=page.headers())
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    selected_fields = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown_fields = set(selected_fields) - PRODUCT_LIST_FIELDS
+    if unknown_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}"
+        )
+    return selected_fields
+
+
+async def build_product_page(limit: int, after, selected_fields: Optional[List[str]]) -> CachedResponse:
+    # Taken before the read, so a write racing with the build can't end up older than the page
+    last_modified = to_http_date(catalog_cache.cleared_at)
+    products = await product_crud.get_products_page(limit, after, selected_fields)
+    await inventory_crud.add_shard_stock(products)
+
+    next_cursor = None
+    if len(products) == limit:
+        last_product = products[-1]
+        next_cursor = encode_cursor(last_product['createdAt'], last_product['_id'])
+
+    if selected_fields and 'createdAt' not in selected_fields:
+        for product in products:
+            del product['createdAt']
+
+    body = orjson.dumps({
+        "items": product_list_serializer.many(products),
+        "next_cursor": next_cursor
+    })
+    return CachedResponse(body=body, etag=make_etag(body), last_modified=last_modified)
+
+
+async def lookup_products(product_ids: List[str]) -> Dict[str, Any]:
+    """
+    Resolve product ids from the product cache, fetching only the misses in one $in query.
+    Items come back in request order; ids that don't exist (or aren't valid ids) are listed as missing.
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    misses: Dict[str, ObjectId] = {}
+    for product_id in product_ids:
+        if product_id in found or product_id in misses:
+            continue
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            found[product_id] = cached
+        elif ObjectId.is_valid(product_id):
+            misses[product_id] = ObjectId(product_id)
+
+    if misses:
+        products = await product_crud.get_products_by_ids(list(misses.values()))
+        await inventory_crud.add_shard_stock(products)
+        for product in products:
+            product_id = str(product['_id'])
+            found[product_id] = product_cache[product_id] = product_serializer.to_dict(product)
+
+    return {
+        "items": [found[product_id] for product_id in product_ids if product_id in found],
+        "missing": [product_id for product_id in dict.fromkeys(product_ids) if product_id not in found]
+    }
+
+
+@router.get("/api/products/lookup", response_model=ProductLookupResult, status_code=status.HTTP_200_OK)
+async def lookup_products_by_query(ids: str = Query(..., description="Comma separated product ids")):
+    product_ids = [product_id.strip() for product_id in ids.split(",") if product_id.strip()]
+    if len(product_ids) > MAX_QUERY_LOOKUP_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_QUERY_LOOKUP_IDS} ids per query string, use POST /api/products/lookup for more"
+        )
+    return ORJSONResponse(await lookup_products(product_ids))
+
+
+@router.post("/api/products/lookup", response_model=ProductLookupResult, status_code=status.HTTP_200_OK)
+async def lookup_products_by_ids(lookup: ProductLookup):
+    if len(lookup.ids) > MAX_LOOKUP_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_LOOKUP_IDS} ids per request"
+        )
+    return ORJSONResponse(await lookup_products(lookup.ids))
+
+
+@router.get("/api/products/search", response_model=ProductPage, status_code=status.HTTP_200_OK)
+async def search_products(
+    q: Optional[str] = Query(None, max_length=200, description="Text to match in name and description"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = False,
+    sort: Optional[Literal["relevance", "newest", "price_asc", "price_desc"]] = Query(None, description="Defaults to relevance with q, newest without"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. name,price")
+):
+
+    q = q.strip() if q else None
+    sort = sort or ("relevance" if q else "newest")
+    if sort == "relevance" and not q:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sorting by relevance needs a search query"
+        )
+    selected_fields = parse_fields(fields)
+
+    after = None
+    skip = 0
+    if cursor:
+        try:
+            value, last_id = decode_sort_cursor(cursor, sort)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        if sort == "relevance":
+            skip = int(value)
+        else:
+            after = (value, last_id)
+
+    if sort == "relevance":
+        limit = min(limit, MAX_RELEVANCE_RESULTS - skip)
+        if limit <= 0:
+            return ORJSONResponse({"items": [], "next_cursor": None})
+    products = await product_crud.search_products(
+        q, min_price, max_price, in_stock, sort, limit, after=after, skip=skip, fields=selected_fields
+    )
+    await inventory_crud.add_shard_stock(products)
+
+    next_cursor = None
+    if products and len(products) == limit:
+        last_product = products[-1]
+        if sort == "relevance":
+            if skip + limit < MAX_RELEVANCE_RESULTS:
+                next_cursor = encode_sort_cursor(sort, skip + limit, last_product['_id'])
+        else:
+            sort_field = product_crud.SEARCH_SORTS[sort][0]
+            next_cursor = encode_sort_cursor(sort, last_product[sort_field], last_product['_id'])
+
+    if selected_fields:
+        for field in ('createdAt', 'price'):
+            if field not in selected_fields:
+                for product in products:
+                    product.pop(field, None)
+
+    return ORJSONResponse({
+        "items": product_list_serializer.many(products),
+        "next_cursor": next_cursor
+    })
+
+
+@router.get("/api/products/cache_stats", status_code=status.HTTP_200_OK)
+async def get_catalog_cache_stats():
+    return catalog_cache.stats()
+
+
+@router.get("/api/products/export", status_code=status.HTTP_200_OK)
+async def export_products(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    cursor: Optional[str] = Query(None, description="Resume after this product id, i.e. the last id received")
+):
+
+    products = product_crud.iter_products(cursor, batch_size=EXPORT_BATCH_SIZE)
+
+    if format == "csv":
+        return StreamingResponse(
+            stream_csv(products, EXPORT_BATCH_SIZE),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="products.csv"'}
+        )
+
+    return StreamingResponse(
+        stream_ndjson(products, EXPORT_BATCH_SIZE),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="products.ndjson"'}
+    )
+
+
+def build_import_product(value: Any) -> Product:
+    if isinstance(value, Exception):
+        raise ValueError(f"Invalid JSON: {value}")
+
+    try:
+        product = ProductCreate.model_validate(value)
+    except ValidationError as e:
+        error = e.errors()[0]
+        raise ValueError(f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}")
+
+    if not product.sku:
+        raise ValueError("sku: Field required for imports")
+
+    document = Product(
+        sku=product.sku,
+        name=product.name,
+        description=product.description,
+        price=product.price,
+        stock=product.stock,
+    )
+    try:
+        document.validate()
+    except DocumentValidationError as e:
+        raise ValueError(str(e))
+    return document
+
+
+# Bulk upsert by sku from a streamed JSON array or NDJSON (Content-Type: application/x-ndjson) body
+@router.post("/api/products/import", response_model=ProductImportResult, status_code=status.HTTP_200_OK)
+async def import_products(request: Request):
+    started = time.perf_counter()
+    if "ndjson" in request.headers.get("content-type", ""):
+        rows = iter_ndjson_rows(request.stream())
+    else:
+        rows = iter_json_array_rows(request.stream())
+
+    result: Dict[str, Any] = {"rows": 0, "upserted": 0, "modified": 0, "matched": 0, "failed": 0, "errors": []}
+
+    def record_error(row: int, message: str):
+        result["failed"] += 1
+        if len(result["errors"]) < MAX_IMPORT_ERRORS:
+            result["errors"].append({"row": row, "message": message})
+
+    async def write_batch(batch: List[Tuple[int, Product]]):
+        written = await product_crud.bulk_upsert_products(batch)
+        for field in ("upserted", "modified", "matched"):
+            result[field] += written[field]
+        for row, message in written["errors"]:
+            record_error(row, message)
+
+    batch: List[Tuple[int, Product]] = []
+    try:
+        async for row, value in rows:
+            result["rows"] += 1
+            try:
+                batch.append((row, build_import_product(value)))
+            except ValueError as e:
+                record_error(row, str(e))
+                continue
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await write_batch(batch)
+                batch = []
+    except UploadFormatError as e:
+        # The rest of the body can't be parsed; keep what was read so far
+        record_error(result["rows"] + 1, str(e))
+
+    if batch:
+        await write_batch(batch)
+
+    if result["upserted"] or result["modified"]:
+        invalidate_product_caches()
+
+    elapsed = time.perf_counter() - started
+    result["elapsed_seconds"] = round(elapsed, 3)
+    result["rows_per_second"] = round(result["rows"] / elapsed, 1) if elapsed > 0 else 0.0
+    return ORJSONResponse(result)
+
+
+@router.patch("/api/products", response_model=ProductBatchUpdateResult, status_code=status.HTTP_200_OK)
+async def batch_update_products(updates: List[ProductBatchUpdate] = Body(...)):
+    """
+    Reprice / restock many products in one bulk write. price and stock are set,
+    stock_delta is applied with $inc so concurrent adjustments don't overwrite each other.
+    Invalid entries are reported by index and skipped; the rest are still applied.
+    """
+    if len(updates) > MAX_BATCH_UPDATES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BATCH_UPDATES} updates per request"
+        )
+
+    operations: List[Tuple[ObjectId, Dict[str, Any], Dict[str, Any]]] = []
+    # Request index of each operation
+    indexes: List[int] = []
+    errors: List[Dict[str, Any]] = []
+    for index, update in enumerate(updates):
+        try:
+            if update.stock is not None and update.stock_delta is not None:
+                raise ValueError("stock and stock_delta are mutually exclusive")
+            set_fields = update.model_dump(include={"price", "stock"}, exclude_none=True)
+            inc_fields = {"stock": update.stock_delta} if update.stock_delta is not None else {}
+            if not set_fields and not inc_fields:
+                raise ValueError("Nothing to update")
+            product_crud.validate_product_fields(set_fields)
+            operations.append((ObjectId(update.id), set_fields, inc_fields))
+            indexes.append(index)
+        except (ValueError, InvalidId, DocumentValidationError) as e:
+            errors.append({"index": index, "message": str(e)})
+
+    result = {"matched": 0, "modified": 0, "not_found": []}
+    if operations:
+        result = await product_crud.bulk_update_products(operations)
+        split = set(result.pop("split"))
+        for index, (product_id, set_fields, _) in zip(indexes, operations):
+            if "stock" in set_fields and str(product_id) in split:
+                errors.append({"index": index, "message": SPLIT_STOCK_MESSAGE})
+        errors.sort(key=lambda error: error["index"])
+        if result["modified"]:
+            catalog_cache.clear()
+            for product_id, _, _ in operations:
+                product_cache.pop(str(product_id), None)
+
+    return ORJSONResponse({**result, "errors": errors})
+
+
+@router.get("/api/products/{product_id}/stock", response_model=ProductStockResponse)
+async def get_product_stock(product_id: str):
+
+    stock = await inventory_crud.get_stock(product_id)
+    if stock is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+
+    return {"id": product_id, "stock": stock[0], "shards": stock[1]}
+
+
+# Spread a hot product's stock over several counters so concurrent checkouts don't all update one document
+@router.post("/api/products/{product_id}/stock_shards", response_model=ProductStockResponse)
+async def split_product_stock(product_id: str, split: ProductStockSplit):
+
+    product = await inventory_crud.split_stock(product_id, split.shards)
+    if not product:
+        if await inventory_crud.get_stock(product_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Product stock is already split"
+        )
+
+    invalidate_product_caches(product_id)
+    return {"id": product_id, "stock": product["stock"], "shards": split.shards}
+
+
+@router.delete("/api/products/{product_id}/stock_shards", response_model=ProductStockResponse)
+async def merge_product_stock(product_id: str):
+
+    if await inventory_crud.merge_stock(product_id) is None:
+        if await inventory_crud.get_stock(product_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Product stock is not split"
+        )
+
+    invalidate_product_caches(product_id)
+    stock, shards = await inventory_crud.get_stock(product_id)
+    return {"id": product_id, "stock": stock, "shards": shards}
 
 
 @router.put("/api/products/{product_id}", response_model=ProductResponse)
 async def update_product(product_id: str, product: ProductUpdate):
 
-    existing_product = Product.objects(id=product_id).first()
-    
-    if not existing_product:
+    values = product.model_dump(exclude_none=True)
+    updated_product = await product_crud.update_product_fields(product_id, values)
+
+    if not updated_product:
+        if "stock" in values and await inventory_crud.get_stock(product_id) is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=SPLIT_STOCK_MESSAGE
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    
-    if product.name is not None:
-        existing_product.name = product.name
-    if product.description is not None:
-        existing_product.description = product.description
-    if product.price is not None:
-        existing_product.price = product.price
-    if product.stock is not None:
-        existing_product.stock = product.stock
-    
-    existing_product.save()
-    
-    return format_mongo_to_pydantic(existing_product, ProductResponse)
+
+    invalidate_product_caches(product_id)
+    await inventory_crud.add_shard_stock([updated_product])
+
+    return ORJSONResponse(product_serializer.to_dict(updated_product))
 
 
 @router.delete("/api/products/{product_id}", status_code=status.HTTP_200_OK)
 async def delete_product(product_id: str):
 
-    existing_product = Product.objects(id=product_id).first()
+    existing_product = await product_crud.get_product(product_id)
     
     if not existing_product:
         raise HTTPException(
@@ -66,7 +492,8 @@ async def delete_product(product_id: str):
             detail="Product not found"
         )
     
-    result = Product.objects(id=product_id).delete()
+    result = await product_crud.delete_product(product_id)
+    invalidate_product_caches(product_id)
     
     if result == 0:
         raise HTTPException(
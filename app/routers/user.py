@@ -1,20 +1,24 @@
-from fastapi import APIRouter, HTTPException, status
-from app.models.user import User, hash_password, check_user_exists, verify_password, get_user_by_email
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.models.user import User, hash_password, verify_and_update_password
+from app.crud.user import check_user_exists, get_user_by_email, create_user, update_user_password
 from app.schemas.user import UserCreate, UserResponse, UserSignIn
 from app.utils.jwt import create_access_token, create_refresh_token
-from app.utils.formatting import format_mongo_to_pydantic
+from app.utils.formatting import get_serializer
+from app.security import user_authenticator, oauth2_scheme
 
 router = APIRouter()
 
+user_serializer = get_serializer(User, UserResponse)
+
 @router.post("/api/users", status_code=status.HTTP_201_CREATED)
 async def sign_up(user: UserCreate):
-    if check_user_exists(user.email):
+    if await check_user_exists(user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
 
     new_user = User(
         name=user.name,
@@ -23,12 +27,12 @@ async def sign_up(user: UserCreate):
         dob=user.dob,
     )
 
-    new_user.save()
+    new_user = await create_user(new_user)
 
-    access_token = create_access_token({"sub": str(new_user.id)})
-    refresh_token = create_refresh_token({"sub": str(new_user.id)})
+    access_token = create_access_token({"sub": str(new_user.id), "ver": new_user.tokenVersion})
+    refresh_token = create_refresh_token({"sub": str(new_user.id), "ver": new_user.tokenVersion})
 
-    user_response = format_mongo_to_pydantic(new_user, UserResponse)
+    user_response = user_serializer.from_document(new_user)
 
     return {
         "user": user_response,
@@ -39,7 +43,7 @@ async def sign_up(user: UserCreate):
    
 @router.post("/api/users/sign_in", status_code=status.HTTP_200_OK)
 async def sign_in(user: UserSignIn):
-    db_user = get_user_by_email(user.email)
+    db_user = await get_user_by_email(user.email)
     
     if not db_user:
         raise HTTPException(
@@ -47,22 +51,41 @@ async def sign_in(user: UserSignIn):
             detail="Invalid credentials"
         )
     
-    if not verify_password(user.password, db_user.password):
+    is_valid, new_hash = await verify_and_update_password(user.password, db_user.password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
+
+    if new_hash:
+        await update_user_password(db_user.id, new_hash)
+        user_authenticator.invalidate_user(db_user.id)
     
-    access_token = create_access_token(data={"sub": str(db_user.id)})
-    refresh_token = create_refresh_token(data={"sub": str(db_user.id)})
+    access_token = create_access_token(data={"sub": str(db_user.id), "ver": db_user.tokenVersion})
+    refresh_token = create_refresh_token(data={"sub": str(db_user.id), "ver": db_user.tokenVersion})
     
-    user_response = format_mongo_to_pydantic(db_user, UserResponse)
+    user_response = user_serializer.from_document(db_user)
 
     return {
         "user": user_response,
         "access_token": access_token,
         "refresh_token": refresh_token
     }
-    
 
-    
+
+@router.post("/api/users/{user_id}/sign_out", status_code=status.HTTP_200_OK)
+async def sign_out(user_id: str, all_devices: bool = False, token: str = Depends(oauth2_scheme)):
+    await user_authenticator.authenticate_user(token, user_id)
+
+    if all_devices:
+        await user_authenticator.revoke_user_tokens(user_id)
+    else:
+        await user_authenticator.revoke_token(token)
+
+    return {"message": "Signed out successfully"}
+
+
+@router.get("/api/users/cache_stats", status_code=status.HTTP_200_OK)
+async def get_auth_cache_stats():
+    return user_authenticator.cache_stats()
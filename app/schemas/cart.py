@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 import datetime
 
 class CartItemCreate(BaseModel):
@@ -19,6 +19,30 @@ class CartItemResponse(BaseModel):
             datetime.date: lambda v: v.isoformat()
         }
 
+class CartProductSummary(BaseModel):
+    id: str
+    name: str
+    price: float
+    stock: int
+
+class CartItemExpandedResponse(CartItemResponse):
+    product: Optional[CartProductSummary] = None
+
+class CartSummary(BaseModel):
+    items: int
+    quantity: int
+    subtotal: float
+    out_of_stock: List[str]
+
+class CartOperation(BaseModel):
+    # add: increase by quantity, set: replace the quantity (0 removes), remove: drop the item
+    op: Literal["add", "set", "remove"]
+    product_id: str
+    quantity: int = Field(1, ge=0)
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation] = Field(..., min_length=1, max_length=500)
+
 class CartItemDelete(BaseModel):
     product_id: str
     quantity: int
\ No newline at end of file
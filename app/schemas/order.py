@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class OrderItemResponse(BaseModel):
+    product_id: str
+    name: str
+    price: float
+    quantity: int
+
+class OrderResponse(BaseModel):
+    id: str
+    user_id: str
+    items: List[OrderItemResponse]
+    total: float
+    status: str
+    expiresAt: str
+    createdAt: str
+    updatedAt: str
@@ -1,8 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 
 class ProductCreate(BaseModel):
+    sku: Optional[str] = None
     name: str
     description: Optional[str] = None
     price: float
@@ -11,6 +12,7 @@ class ProductCreate(BaseModel):
     class Config:
         schema_extra = {
             "example": {
+                "sku": "SKU-0001",
                 "name": "Sample Product",
                 "description": "This is a sample product.",
                 "price": 29.99,
@@ -24,8 +26,26 @@ class ProductUpdate(BaseModel):
     price: Optional[float] = None
     stock: Optional[int] = None
 
+class ProductBatchUpdate(BaseModel):
+    id: str
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    # Relative change applied with $inc; cannot be combined with stock
+    stock_delta: Optional[int] = None
+
+class ProductBatchUpdateError(BaseModel):
+    index: int
+    message: str
+
+class ProductBatchUpdateResult(BaseModel):
+    matched: int
+    modified: int
+    not_found: List[str]
+    errors: List[ProductBatchUpdateError]
+
 class ProductResponse(BaseModel):
     id: str
+    sku: Optional[str] = None
     name: str
     description: Optional[str] = None
     price: float
@@ -36,4 +56,47 @@ class ProductResponse(BaseModel):
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat() if v else None
-        }
\ No newline at end of file
+        }
+
+class ProductListItem(BaseModel):
+    id: str
+    sku: Optional[str] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    createdAt: Optional[str] = None
+    updatedAt: Optional[str] = None
+
+class ProductPage(BaseModel):
+    items: List[ProductListItem]
+    next_cursor: Optional[str] = None
+
+class ProductImportError(BaseModel):
+    row: int
+    message: str
+
+class ProductImportResult(BaseModel):
+    rows: int
+    upserted: int
+    modified: int
+    matched: int
+    failed: int
+    errors: List[ProductImportError]
+    elapsed_seconds: float
+    rows_per_second: float
+
+class ProductLookup(BaseModel):
+    ids: List[str]
+
+class ProductLookupResult(BaseModel):
+    items: List[ProductResponse]
+    missing: List[str]
+
+class ProductStockSplit(BaseModel):
+    shards: int = Field(ge=2, le=64)
+
+class ProductStockResponse(BaseModel):
+    id: str
+    stock: int
+    shards: int
@@ -1,24 +1,151 @@
-from bson import ObjectId
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple, Union
+from cachetools import TLRUCache
 from fastapi import HTTPException
-from mongoengine import DoesNotExist
 from fastapi.security import OAuth2PasswordBearer
 from app.utils.jwt import verify_token
 from app.models.user import User
-from datetime import datetime, timezone
+from app.crud.user import get_user_by_id
+from app.crud.token import get_active_revocations, revoke_token, revoke_user_tokens
+from app.constants import constants
+from app.settings import settings
+from app.invalidation import invalidation_bus
+from app.timing import timed_phase
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token")
 
-class UserAuthenticator:
+
+@dataclass(frozen=True)
+class TokenUser:
+    """
+    The authenticated user as described by trusted token claims, without a DB lookup.
+    """
+    id: str
+    token_version: int
+
+
+class TokenDenylist:
+    """
+    In-memory copy of the active token revocations, reloaded in bulk every few seconds.
+    Revocations made by this process apply at once; other workers pick them up on their next refresh.
+    """
     def __init__(self):
-        pass
+        self.revoked_ids: Set[str] = set()
+        self.min_versions: Dict[str, int] = {}
+        # Revocations made by this process while a refresh is reading, one log per running refresh
+        self._refresh_logs: List["TokenDenylist"] = []
 
-    
-    def check_user_existence(self, user_id: str) -> User:
+    def add_token(self, jti: str):
+        self.revoked_ids.add(jti)
+        for log in self._refresh_logs:
+            log.add_token(jti)
+
+    def add_user_version(self, user_id: str, token_version: int):
+        self.min_versions[user_id] = max(token_version, self.min_versions.get(user_id, 0))
+        for log in self._refresh_logs:
+            log.add_user_version(user_id, token_version)
+
+    def is_revoked(self, payload: dict) -> bool:
+        if payload.get("jti") in self.revoked_ids:
+            return True
+        return payload.get("ver", 0) < self.min_versions.get(payload.get("sub"), 0)
+
+    async def refresh(self):
+        # A revocation made during the query may be missing from its result, so it is kept from the log
+        snapshot = TokenDenylist()
+        self._refresh_logs.append(snapshot)
         try:
-            user = User.objects.get(id=ObjectId(user_id))  
-            return user
-        except DoesNotExist:
+            revocations = await get_active_revocations()
+        finally:
+            self._refresh_logs.remove(snapshot)
+
+        for revocation in revocations:
+            if revocation.get("jti"):
+                snapshot.add_token(revocation["jti"])
+            else:
+                snapshot.add_user_version(str(revocation["user_id"]), revocation["tokenVersion"])
+        self.revoked_ids = snapshot.revoked_ids
+        self.min_versions = snapshot.min_versions
+
+    async def run(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving with the last known denylist until the database is reachable again
+                logger.warning("Token denylist refresh failed: %s", e)
+
+
+token_denylist = TokenDenylist()
+
+class UserAuthenticator:
+    def __init__(self, cache_size: int = settings.AUTH_CACHE_SIZE, cache_ttl: int = settings.AUTH_CACHE_TTL):
+        # token hash -> (decoded payload, user); an entry never outlives its token's exp claim
+        self.cache_ttl = cache_ttl
+        self.cache: TLRUCache = TLRUCache(maxsize=cache_size, ttu=self._time_to_use, timer=time.time)
+        # user id -> keys of their cached tokens, so a user is invalidated without scanning the cache.
+        # Evicted and expired keys linger until pruned, which only costs a pop of a missing key.
+        self.user_keys: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _time_to_use(self, key: str, value: Tuple[dict, User], now: float) -> float:
+        payload, _ = value
+        expiry = now + self.cache_ttl
+        return min(expiry, payload["exp"]) if payload.get("exp") else expiry
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    
+    def invalidate_token(self, token: str):
+        self.cache.pop(self._token_key(token), None)
+
+    def _index_user_key(self, user_id: str, key: str):
+        self.user_keys.setdefault(user_id, set()).add(key)
+        if len(self.user_keys) > self.cache.maxsize:
+            # More users than the cache can hold entries for, so most are gone; rebuild from what is left
+            self.user_keys = {}
+            for cached_key, (_, user) in list(self.cache.items()):
+                self.user_keys.setdefault(str(user.id), set()).add(cached_key)
+
+    
+    def invalidate_user(self, user_id: Optional[str]):
+        # Called after a user is updated or deleted so no request keeps seeing the old document;
+        # None means some user changed but which one is unknown
+        if user_id is None:
+            self.cache.clear()
+            self.user_keys.clear()
+            return
+
+        for key in self.user_keys.pop(str(user_id), ()):
+            self.cache.pop(key, None)
+
+    
+    def cache_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.cache),
+            "maxsize": self.cache.maxsize,
+            "users": len(self.user_keys)
+        }
+
+    
+    async def check_user_existence(self, user_id: str) -> User:
+        user = await get_user_by_id(user_id)
+        if user is None:
             raise HTTPException(status_code=404, detail="User not found")
+        return user
 
     
     def verify_token(self, token: str) -> dict:
@@ -32,23 +159,79 @@ class UserAuthenticator:
             raise HTTPException(status_code=401, detail=str(e))
 
     
-    def get_user_from_token(self, token: str) -> User:
+    async def get_user_from_token(self, token: str) -> User:
+        key = self._token_key(token)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            payload, user = cached
+            self.check_token_not_revoked(payload)
+            return user
+
+        self.misses += 1
         payload = self.verify_token(token)
         user_id_from_token = payload.get("sub")  
         
         if user_id_from_token is None:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        user = self.check_user_existence(user_id_from_token)
+        self.check_token_not_revoked(payload)
+        user = await self.check_user_existence(user_id_from_token)
+        self.cache[key] = (payload, user)
+        self._index_user_key(str(user.id), key)
         return user
 
     
+    def get_user_from_claims(self, token: str) -> TokenUser:
+        payload = self.verify_token(token)
+        user_id_from_token = payload.get("sub")
+
+        if user_id_from_token is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        self.check_token_not_revoked(payload)
+        return TokenUser(id=user_id_from_token, token_version=payload.get("ver", 0))
+
+    
+    def check_token_not_revoked(self, payload: dict):
+        if token_denylist.is_revoked(payload):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    
+    async def revoke_token(self, token: str):
+        payload = self.verify_token(token)
+        if not payload.get("jti"):
+            # Tokens issued before token ids existed can only be revoked together
+            await self.revoke_user_tokens(payload["sub"])
+            return
+
+        await revoke_token(payload["sub"], payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+        token_denylist.add_token(payload["jti"])
+        self.invalidate_token(token)
+
+    
+    async def revoke_user_tokens(self, user_id: str):
+        # Every token issued so far expires within the refresh token lifetime
+        expires_at = datetime.utcnow() + timedelta(days=constants.REFRESH_TOKEN_EXPIRE_DAYS)
+        token_version = await revoke_user_tokens(user_id, expires_at)
+        token_denylist.add_user_version(user_id, token_version)
+        self.invalidate_user(user_id)
+
+    
     def check_user_id_match(self, user_id_from_token: str, user_id: str):
         if user_id_from_token != user_id:
             raise HTTPException(status_code=403, detail="Not Authorized")
 
     
-    def authenticate_user(self, token: str, user_id: str) -> User:
-        current_user = self.get_user_from_token(token)
+    @timed_phase("auth")
+    async def authenticate_user(self, token: str, user_id: str) -> Union[User, TokenUser]:
+        if settings.AUTH_TRUST_TOKEN_CLAIMS:
+            current_user = self.get_user_from_claims(token)
+        else:
+            current_user = await self.get_user_from_token(token)
         self.check_user_id_match(str(current_user.id), user_id)  
         return current_user
+
+
+user_authenticator = UserAuthenticator()
+invalidation_bus.subscribe(User, user_authenticator.invalidate_user)
@@ -0,0 +1,192 @@
+"""
+Seed a database with synthetic users, products and cart items for scale testing.
+
+    python -m app.seed [--users 100000] [--products 50000] [--cart-items 1000000]
+                       [--seed 42] [--batch-size 5000] [--parallel 8] [--drop]
+
+The same --seed always produces the same documents, ids included. Popularity is skewed:
+a few products appear in most carts and a few power users own most cart items.
+"""
+import argparse
+import asyncio
+import bisect
+import datetime
+import itertools
+import random
+import struct
+import time
+from typing import Any, Callable, Dict, Iterator, List
+from bson import ObjectId
+from mongoengine import Document
+from app.database import connect_db, disconnect_db, get_collection
+from app.indexes import reconcile_all_indexes
+from app.models.user import User, pwd_context
+from app.models.product import Product
+from app.models.cart import CartItem
+
+# Every seeded user signs in with this password
+SEED_PASSWORD = "password"
+EPOCH = datetime.datetime(2024, 1, 1)
+SPAN_SECONDS = 365 * 24 * 3600
+WORDS = (
+    "classic", "wireless", "organic", "compact", "premium", "portable", "smart", "vintage",
+    "ergonomic", "waterproof", "lightweight", "deluxe", "eco", "pro", "mini", "ultra"
+)
+NOUNS = (
+    "headphones", "backpack", "lamp", "kettle", "chair", "keyboard", "jacket", "bottle",
+    "watch", "speaker", "notebook", "blender", "sneakers", "camera", "desk", "mug"
+)
+
+
+def make_object_id(rng: random.Random, created_at: datetime.datetime) -> ObjectId:
+    # Time-ordered like a real ObjectId, but the remaining 8 bytes come from the seeded generator
+    timestamp = int((created_at - datetime.datetime(1970, 1, 1)).total_seconds())
+    return ObjectId(struct.pack(">I", timestamp) + rng.getrandbits(64).to_bytes(8, "big"))
+
+
+def zipf_sampler(rng: random.Random, count: int, exponent: float) -> Callable[[], int]:
+    """
+    Returns a function drawing indexes in [0, count), index i with weight 1 / (i + 1) ** exponent.
+    """
+    cumulative = list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(count)))
+    total = cumulative[-1]
+    return lambda: min(bisect.bisect_left(cumulative, rng.random() * total), count - 1)
+
+
+def random_time(rng: random.Random) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(seconds=rng.randrange(SPAN_SECONDS))
+
+
+def generate_users(rng: random.Random, count: int, password_hash: str) -> Iterator[Dict[str, Any]]:
+    for i in range(count):
+        created_at = random_time(rng)
+        yield {
+            '_id': make_object_id(rng, created_at),
+            'name': f"Seed User {i}",
+            'email': f"user{i}@seed.example",
+            'password': password_hash,
+            'dob': datetime.datetime(rng.randint(1950, 2006), rng.randint(1, 12), rng.randint(1, 28)),
+            'tokenVersion': 0,
+            'createdAt': created_at,
+            'updatedAt': created_at
+        }
+
+
+def generate_products(rng: random.Random, count: int) -> Iterator[Dict[str, Any]]:
+    for i in range(count):
+        created_at = random_time(rng)
+        yield {
+            '_id': make_object_id(rng, created_at),
+            'sku': f"SEED-{i:08d}",
+            'name': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(NOUNS)} {i}",
+            'description': " ".join(rng.choice(WORDS + NOUNS) for _ in range(rng.randint(8, 30))),
+            'price': round(min(rng.lognormvariate(3.5, 1.0), 5000.0), 2),
+            'stock': int(rng.expovariate(1 / 200)),
+            'stockShards': 0,
+            'createdAt': created_at,
+            'updatedAt': created_at
+        }
+
+
+def generate_cart_items(
+    rng: random.Random, count: int, user_ids: List[ObjectId], product_ids: List[ObjectId]
+) -> Iterator[Dict[str, Any]]:
+    # Power users and hot products: both follow a Zipf-like popularity curve
+    pick_user = zipf_sampler(rng, len(user_ids), 0.8)
+    pick_product = zipf_sampler(rng, len(product_ids), 1.1)
+    # (user, product) is unique, and a skewed draw can't always find a free pair
+    count = min(count, len(user_ids) * len(product_ids) // 2)
+    seen = set()
+    while len(seen) < count:
+        user_index, product_index = pick_user(), pick_product()
+        key = user_index * len(product_ids) + product_index
+        if key in seen:
+            continue
+        seen.add(key)
+        created_at = random_time(rng)
+        yield {
+            '_id': make_object_id(rng, created_at),
+            'user_id': user_ids[user_index],
+            'product_id': product_ids[product_index],
+            'quantity': min(1 + int(rng.expovariate(1.0)), 10),
+            'createdAt': created_at,
+            'updatedAt': created_at
+        }
+
+
+async def insert_all(document: Document, documents: Iterator[Dict[str, Any]], batch_size: int, parallel: int) -> List[ObjectId]:
+    """
+    insert_many the documents in batches, with up to `parallel` batches in flight.
+    Returns the inserted ids in generation order.
+    """
+    collection = get_collection(document)
+    semaphore = asyncio.Semaphore(parallel)
+    tasks = []
+    ids: List[ObjectId] = []
+    started = time.perf_counter()
+
+    async def insert(batch: List[Dict[str, Any]]):
+        try:
+            await collection.insert_many(batch, ordered=False)
+        finally:
+            semaphore.release()
+
+    while True:
+        batch = list(itertools.islice(documents, batch_size))
+        if not batch:
+            break
+        ids.extend(item['_id'] for item in batch)
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(insert(batch)))
+    await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    rate = len(ids) / elapsed if elapsed > 0 else 0.0
+    print(f"Inserted {len(ids)} {collection.name} in {elapsed:.1f} s ({rate:.0f} docs/s)")
+    return ids
+
+
+async def seed(users: int, products: int, cart_items: int, seed_value: int, batch_size: int, parallel: int, drop: bool):
+    if drop:
+        for document in (User, Product, CartItem):
+            await get_collection(document).drop()
+
+    # One hash for every user; hashing millions of passwords would dominate the run
+    password_hash = pwd_context.hash(SEED_PASSWORD)
+
+    # Separate generators per collection, so changing one count doesn't reshuffle the others
+    user_ids = await insert_all(User, generate_users(random.Random(f"{seed_value}-users"), users, password_hash), batch_size, parallel)
+    product_ids = await insert_all(Product, generate_products(random.Random(f"{seed_value}-products"), products), batch_size, parallel)
+    if user_ids and product_ids and cart_items:
+        await insert_all(
+            CartItem,
+            generate_cart_items(random.Random(f"{seed_value}-carts"), cart_items, user_ids, product_ids),
+            batch_size,
+            parallel
+        )
+
+    # Building indexes once after the load is faster than maintaining them per insert
+    await reconcile_all_indexes(create_missing=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic users, products and cart items")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--cart-items", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--drop", action="store_true", help="drop the users, products and cart_items collections first")
+    args = parser.parse_args()
+
+    await connect_db()
+    try:
+        await seed(args.users, args.products, args.cart_items, args.seed, args.batch_size, args.parallel, args.drop)
+    finally:
+        await disconnect_db()
+
+
+# python -m app.seed
+if __name__ == "__main__":
+    asyncio.run(main())
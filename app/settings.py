@@ -14,6 +14,51 @@ class Settings(BaseSettings):
     # JWT
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str
+
+    # Create declared indexes that are missing at startup; when off they are only reported
+    AUTO_CREATE_INDEXES: bool = True
+
+    # Trust the user id and token version claims instead of loading the user on every request
+    AUTH_TRUST_TOKEN_CLAIMS: bool = False
+    TOKEN_DENYLIST_REFRESH_SECONDS: int = 30
+
+    # Authenticated user cache (per process)
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 60
+
+    # Serialized product listing cache (per process)
+    CATALOG_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PRODUCT_CACHE_SIZE: int = 10000
+    PRODUCT_CACHE_TTL: int = 300
+
+    # Cross-worker cache invalidation when change streams are unavailable
+    CACHE_INVALIDATION_POLL_SECONDS: float = 2.0
+
+    # Password hashing pool
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+
+    # Checkout stock reservations
+    RESERVATION_TTL_SECONDS: int = 900
+    RESERVATION_SWEEP_SECONDS: int = 30
+
+    # Cart write-behind: buffer +/- quantity clicks and write them in bulk.
+    # Up to CART_FLUSH_INTERVAL_MS of changes are lost if a worker dies
+    CART_WRITE_BEHIND: bool = False
+    CART_FLUSH_INTERVAL_MS: int = 200
+    CART_BUFFER_MAX_PENDING: int = 1000
+
+    # Prometheus metrics on /metrics
+    METRICS_ENABLED: bool = True
+    # Server-Timing header with per-request query count, DB, auth and serialization time
+    SERVER_TIMING_ENABLED: bool = False
+
+    # Load shedding and query deadlines, per route (overrides in app/admission.py); 0 disables
+    REQUEST_DEADLINE_SECONDS: float = 10.0
+    ADMISSION_MAX_CONCURRENCY: int = 64
+    ADMISSION_MAX_QUEUE: int = 128
+    ADMISSION_QUEUE_TIMEOUT: float = 1.0
+    ADMISSION_RETRY_AFTER: int = 1
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,121 @@
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class RequestTiming:
+    """
+    Where one request spent its time: MongoDB commands plus named phases (auth, serialize).
+    Commands finish on motor's executor threads, hence the lock.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_command(self, seconds: float):
+        with self._lock:
+            self.db_count += 1
+            self.db_seconds += seconds
+
+    def add_phase(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def header(self) -> str:
+        metrics = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_count} queries"']
+        metrics += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        metrics.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def timed_phase(name: str) -> Callable:
+    """
+    Add the decorated function's run time to the current request's `name` phase.
+    Outside an instrumented request it costs one context variable lookup.
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                timing = request_timing.get()
+                if timing is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    timing.add_phase(name, time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timing = request_timing.get()
+            if timing is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing.add_phase(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class RequestTimingListener(monitoring.CommandListener):
+    # motor runs pymongo with a copy of the caller's context, so the request's timing is visible here
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def _finished(self, event):
+        timing = request_timing.get()
+        if timing is not None:
+            timing.add_command(event.duration_micros / 1e6)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event)
+
+
+request_timing_listener = RequestTimingListener()
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header with the request's MongoDB command count and time,
+    the auth and serialization phases, and the total. Work done after the response
+    has started (streamed bodies) isn't included.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", timing.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timing.reset(token)
@@ -0,0 +1,17 @@
+import asyncio
+import contextvars
+from typing import Coroutine, TypeVar
+
+T = TypeVar('T')
+
+
+async def run_detached(coroutine: Coroutine[object, object, T]) -> T:
+    """
+    Run a coroutine in a fresh context, outside the request that awaits it. pymongo.timeout keeps
+    the request deadline in a context variable and a nested timeout can only shorten it, so this
+    is the only way for compensating writes (putting back stock or cart items after the deadline
+    hit) and work shared with other requests to get their own time. Shielded, so cancelling the
+    caller doesn't cancel the work either.
+    """
+    task = asyncio.create_task(coroutine, context=contextvars.Context())
+    return await asyncio.shield(task)
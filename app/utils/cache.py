@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Hashable, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime.datetime] = None
+
+    def headers(self) -> Dict[str, str]:
+        # no-cache lets clients and CDNs store the body but makes them revalidate it
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator derived from the bytes, so every worker agrees on it
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def to_http_date(value: datetime.datetime) -> datetime.datetime:
+    # Stored datetimes are naive UTC; HTTP dates have one second resolution
+    return value.replace(tzinfo=datetime.timezone.utc, microsecond=0)
+
+
+def is_not_modified(request_headers: Mapping[str, str], entry: CachedResponse) -> bool:
+    """
+    Evaluate If-None-Match, or If-Modified-Since when no If-None-Match is sent, against a cached response.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match uses weak comparison, so W/ prefixed tags match too
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == entry.etag for tag in tags)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is None or entry.last_modified is None:
+        return False
+    try:
+        return entry.last_modified <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+class ResponseCache:
+    """
+    LRU cache of pre-serialized response bodies bounded by their total size in bytes.
+    Concurrent misses for the same key share one build, and a build that overlaps
+    an invalidation is served but not stored.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Every write clears the cache, so nothing cached has changed since the last clear;
+        # this serves as Last-Modified for all entries, deletes and reorderings included
+        self.cleared_at = datetime.datetime.utcnow()
+        self.size_bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    async def get_or_build(self, key: Hashable, build: Callable[[], Awaitable[CachedResponse]]) -> CachedResponse:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._build_and_store(key, build, self.generation))
+            self._pending[key] = pending
+        # Shielded so one client disconnecting does not cancel the build others are waiting on
+        return await asyncio.shield(pending)
+
+    async def _build_and_store(self, key: Hashable, build: Callable[[], Awaitable[CachedResponse]], generation: int) -> CachedResponse:
+        try:
+            entry = await build()
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                del self._pending[key]
+
+        if generation == self.generation:
+            self._store(key, entry)
+        return entry
+
+    def _store(self, key: Hashable, entry: CachedResponse):
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size_bytes -= len(previous.body)
+
+        self._entries[key] = entry
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted.body)
+            self.evictions += 1
+
+    def clear(self):
+        self.generation += 1
+        self.cleared_at = datetime.datetime.utcnow()
+        self._entries.clear()
+        self._pending = {}
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "generation": self.generation
+        }
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCursor
+
+PRODUCT_EXPORT_FIELDS = ['id', 'sku', 'name', 'description', 'price', 'stock', 'createdAt', 'updatedAt']
+
+
+def _export_row(document: Dict[str, Any]) -> Dict[str, Any]:
+    row = {}
+    for field in PRODUCT_EXPORT_FIELDS:
+        value = document.get('_id' if field == 'id' else field)
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        row[field] = value
+    return row
+
+
+async def _batches(cursor: AsyncIOMotorCursor, batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    batch = []
+    async for document in cursor:
+        batch.append(_export_row(document))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_ndjson(cursor: AsyncIOMotorCursor, batch_size: int) -> AsyncIterator[bytes]:
+    """
+    Encode a cursor as newline delimited JSON, one chunk per batch so memory stays constant.
+    """
+    async for batch in _batches(cursor, batch_size):
+        yield "".join(json.dumps(row, separators=(',', ':')) + "\n" for row in batch).encode()
+
+
+async def stream_csv(cursor: AsyncIOMotorCursor, batch_size: int) -> AsyncIterator[bytes]:
+    """
+    Encode a cursor as CSV with a header row, one chunk per batch so memory stays constant.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=PRODUCT_EXPORT_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue().encode()
+
+    async for batch in _batches(cursor, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
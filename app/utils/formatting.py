@@ -1,49 +1,143 @@
-from typing import Type, TypeVar, Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, get_args, get_origin
 from pydantic import BaseModel
-from mongoengine import Document
+from mongoengine import Document, fields
 import datetime
-from bson import ObjectId
+from app.timing import timed_phase
 
-# Define type variables
-TDocument = TypeVar('TDocument', bound=Document)
-TSchema = TypeVar('TSchema', bound=BaseModel)
+Converter = Optional[Callable[[Any], Any]]
 
-# general formatting function
-def format_mongo_to_pydantic(document: TDocument, schema: Type[TSchema]) -> TSchema:
+
+def _to_str(value: Any) -> str:
+    return str(value)
+
+
+def _datetime_to_iso(value: Any) -> str:
+    return value.isoformat()
+
+
+def _date_to_iso(value: Any) -> str:
+    # DateField values are stored as midnight datetimes
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return value.isoformat()
+
+
+def _field_converter(field: fields.BaseField) -> Converter:
+    if isinstance(field, (fields.ObjectIdField, fields.ReferenceField)):
+        return _to_str
+    # DateField subclasses DateTimeField, so it has to be checked first
+    if isinstance(field, fields.DateField):
+        return _date_to_iso
+    if isinstance(field, fields.DateTimeField):
+        return _datetime_to_iso
+    return None
+
+
+def _nested_schema(annotation: Any) -> Optional[Type[BaseModel]]:
+    for candidate in (annotation, *get_args(annotation)):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+
+class Serializer:
     """
-    Convert a MongoEngine document to a Pydantic model.
-    Args:
-        document (Document): The MongoEngine document.
-        schema (Type[BaseModel]): The Pydantic schema to use for formatting.
-    Returns:
-        BaseModel: The formatted Pydantic model.
+    Converts raw MongoDB documents into JSON-ready dicts for one (Document, schema) pair.
+    The field mapping and per-field converters are worked out once, when the serializer is built,
+    so serializing a document is a single pass over precomputed (name, key, converter) tuples.
     """
-    # Convert MongoEngine fields to Pydantic fields
-    document_data: Dict[str, any] = {field: getattr(document, field) for field in schema.__annotations__.keys() if hasattr(document, field)}
+    def __init__(
+        self,
+        document_cls: Type[Document],
+        schema: Type[BaseModel],
+        nested: Optional[Dict[str, Type[Document]]] = None,
+        exclude_missing: bool = False
+    ):
+        self.document_cls = document_cls
+        self.schema = schema
+        self.fields: List[Tuple[str, str, Converter]] = []
+        self.defaults: Dict[str, Any] = {}
+        nested = nested or {}
+
+        for name, schema_field in schema.model_fields.items():
+            document_field = document_cls._fields.get(name)
+            key = '_id' if name == 'id' else (document_field.db_field if document_field else name)
+
+            nested_schema = _nested_schema(schema_field.annotation)
+            if nested_schema is not None:
+                nested_serializer = get_serializer(nested[name], nested_schema)
+                # List[Schema] fields hold arrays of embedded documents
+                converter = nested_serializer._many if get_origin(schema_field.annotation) is list else nested_serializer._to_dict
+            elif document_field is not None:
+                converter = _field_converter(document_field)
+            else:
+                converter = None
 
-    # Format ObjectId fields and datetime fields
-    for field in schema.__annotations__.keys():
-        if isinstance(document_data.get(field), ObjectId):
-            document_data[field] = str(document_data[field])
-        elif isinstance(document_data.get(field), datetime.datetime):
-            document_data[field] = document_data[field].isoformat()
+            self.fields.append((name, key, converter))
+            if not exclude_missing and not schema_field.is_required():
+                self.defaults[name] = schema_field.default
 
-    return schema(**document_data)
+    @timed_phase("serialize")
+    def to_dict(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Serialize a raw MongoDB document. Fields absent from the document (e.g. projected out)
+        take the schema default, or are omitted when the serializer excludes missing fields.
+        Args:
+            document (dict): The raw MongoDB document.
+        Returns:
+            dict: The JSON-ready representation of the schema.
+        """
+        return self._to_dict(document)
 
+    def _to_dict(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        data = {}
+        for name, key, converter in self.fields:
+            if key in document:
+                value = document[key]
+                data[name] = converter(value) if converter is not None and value is not None else value
+            elif name in self.defaults:
+                data[name] = self.defaults[name]
+        return data
 
-# cart formatting function
-def cart_mongo_to_pydantic(document, schema):
-    document_data = {
-        'id': str(document.id),
-        'user_id': str(document.user_id.id),
-        'product_id': str(document.product_id.id),
-        'quantity': document.quantity,
-        'createdAt': document.createdAt.isoformat(),
-        'updatedAt': document.updatedAt.isoformat()
-    }
-    return schema(**document_data)
+    @timed_phase("serialize")
+    def from_document(self, document: Document) -> Dict[str, Any]:
+        """
+        Serialize a MongoEngine document through its raw MongoDB representation.
+        """
+        return self._to_dict(document.to_mongo())
 
+    @timed_phase("serialize")
+    def many(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._many(documents)
 
+    # Untimed versions, for nested fields and other serializers' loops
+    def _many(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        to_dict = self._to_dict
+        return [to_dict(document) for document in documents]
 
 
+# serializer registry, one compiled serializer per (Document, schema) pair
+_serializers: Dict[Tuple[Type[Document], Type[BaseModel], bool], Serializer] = {}
 
+
+def get_serializer(
+    document_cls: Type[Document],
+    schema: Type[BaseModel],
+    nested: Optional[Dict[str, Type[Document]]] = None,
+    exclude_missing: bool = False
+) -> Serializer:
+    """
+    Return the compiled serializer for a (Document, schema) pair, building it on first use.
+    Routers call this at import time so no request pays for compilation.
+    Args:
+        document_cls (Type[Document]): The MongoEngine document the raw data comes from.
+        schema (Type[BaseModel]): The Pydantic schema describing the response.
+        nested (dict): Document class for each schema field holding a joined or embedded sub-document.
+        exclude_missing (bool): Omit absent fields instead of filling schema defaults.
+    Returns:
+        Serializer: The compiled serializer.
+    """
+    key = (document_cls, schema, exclude_missing)
+    if key not in _serializers:
+        _serializers[key] = Serializer(document_cls, schema, nested, exclude_missing)
+    return _serializers[key]
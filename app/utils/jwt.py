@@ -1,3 +1,4 @@
+import uuid
 import jwt
 from datetime import datetime, timedelta
 from app.settings import settings
@@ -7,7 +8,7 @@ def create_access_token(data: dict) -> str:
     expires_delta = timedelta(days=constants.ACCESS_TOKEN_EXPIRE_DAYS)
     expire = datetime.utcnow() + expires_delta
     to_encode = data.copy()
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
@@ -15,7 +16,7 @@ def create_refresh_token(data: dict) -> str:
     expires_delta = timedelta(days=constants.REFRESH_TOKEN_EXPIRE_DAYS)
     expire = datetime.utcnow() + expires_delta
     to_encode = data.copy()
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
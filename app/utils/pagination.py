@@ -0,0 +1,56 @@
+import base64
+import datetime
+import json
+from typing import Any, Tuple, Union
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def encode_cursor(created_at: datetime.datetime, document_id: ObjectId) -> str:
+    """
+    Encode the (createdAt, _id) position of the last returned document as an opaque cursor.
+    """
+    payload = json.dumps({'c': created_at.isoformat(), 'i': str(document_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, ObjectId]:
+    """
+    Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(payload['c']), ObjectId(payload['i'])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def encode_sort_cursor(sort: str, value: Union[datetime.datetime, float, int], document_id: ObjectId) -> str:
+    """
+    Encode the (sort key, _id) position of the last returned document for a given sort order.
+    Datetimes are tagged so they decode back to datetimes rather than strings.
+    """
+    encoded = {'d': value.isoformat()} if isinstance(value, datetime.datetime) else value
+    payload = json.dumps({'s': sort, 'v': encoded, 'i': str(document_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_sort_cursor(cursor: str, sort: str) -> Tuple[Any, ObjectId]:
+    """
+    Decode a cursor produced by encode_sort_cursor. Raises ValueError if it is malformed
+    or was issued for a different sort order.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload['s'] != sort:
+            raise ValueError
+        value = payload['v']
+        if isinstance(value, dict):
+            value = datetime.datetime.fromisoformat(value['d'])
+        elif not isinstance(value, (int, float)):
+            raise ValueError
+        return value, ObjectId(payload['i'])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
@@ -0,0 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from app.settings import settings
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs password hashing off the event loop on a bounded thread pool.
+    hashlib's pbkdf2 releases the GIL, so threads hash in parallel. Once
+    `workers + queue_size` calls are pending, new calls are rejected at once
+    instead of queueing behind a login spike.
+    """
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        # Only touched from the event loop thread, so the counter needs no lock
+        if self.pending >= self.capacity:
+            raise PasswordHasherBusy()
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE
+)
@@ -0,0 +1,22 @@
+from starlette.routing import Match
+from starlette.types import Scope
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(scope: Scope) -> str:
+    """
+    The path template of the route a request will hit (e.g. /api/products/{product_id}), resolved
+    before routing so middlewares can key limits and metrics on it. Cached on the scope.
+    Paths that match no route share one label.
+    """
+    template = scope.get("route_template")
+    if template is None:
+        template = UNMATCHED_ROUTE
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+        scope["route_template"] = template
+    return template
@@ -0,0 +1,133 @@
+import json
+from typing import Any, AsyncIterator, Tuple
+
+_decoder = json.JSONDecoder()
+
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+
+
+class UploadFormatError(ValueError):
+    pass
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yield (row number, parsed value) for each non-blank line of a streamed NDJSON body.
+    A line that is not valid JSON is yielded as its ValueError so the caller can report it and go on.
+    """
+    buffer = b""
+    row = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                row += 1
+                yield row, _parse_line(line)
+    if buffer.strip():
+        yield row + 1, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+
+async def iter_json_array_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yield (row number, parsed value) for each element of a streamed JSON array,
+    decoding elements as soon as they are complete instead of buffering the whole body.
+    Raises UploadFormatError if the body is not a well-formed array.
+    """
+    parser = _JSONArrayParser()
+    pending = b""
+    async for chunk in chunks:
+        # Hold back an incomplete UTF-8 sequence until the next chunk
+        data = pending + chunk
+        try:
+            text, pending = data.decode(), b""
+        except UnicodeDecodeError as e:
+            if e.start < len(data) - 3:
+                raise UploadFormatError("Upload is not valid UTF-8")
+            text, pending = data[:e.start].decode(), data[e.start:]
+
+        for row in parser.feed(text):
+            yield row
+
+    if pending:
+        raise UploadFormatError("Upload is not valid UTF-8")
+    for row in parser.feed("", final=True):
+        yield row
+    if parser.state != "done":
+        raise UploadFormatError("Upload ended before the JSON array was closed")
+
+
+class _JSONArrayParser:
+    def __init__(self):
+        self.buffer = ""
+        self.state = "start"
+        self.row = 0
+
+    def feed(self, text: str, final: bool = False):
+        buffer = self.buffer + text
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position >= len(buffer):
+                break
+
+            char = buffer[position]
+            if self.state == "start":
+                if char != "[":
+                    raise UploadFormatError("Expected a JSON array")
+                self.state = "first"
+                position += 1
+            elif self.state == "first" and char == "]":
+                self.state = "done"
+                position += 1
+            elif self.state in ("first", "value"):
+                try:
+                    value, end = _decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError as e:
+                    if final or not _incomplete(buffer, e):
+                        raise UploadFormatError(f"Invalid JSON in row {self.row + 1}: {e.msg}")
+                    break
+                # A scalar at the very end of the buffer may still be growing, and so may a number
+                # cut off at its fraction or exponent ("1." or "2e")
+                if not final and (end == len(buffer) or _number_tail(value, buffer[end:])):
+                    break
+                self.row += 1
+                yield self.row, value
+                self.state = "separator"
+                position = end
+            elif self.state == "separator" and char in ",]":
+                self.state = "value" if char == "," else "done"
+                position += 1
+            else:
+                raise UploadFormatError(f"Unexpected {char!r} after row {self.row}")
+
+        self.buffer = buffer[position:]
+
+
+def _incomplete(buffer: str, error: json.JSONDecodeError) -> bool:
+    """
+    Whether a decode error only means the value hasn't fully arrived yet. Anything else is
+    reported at once instead of buffering the rest of the upload behind a broken row.
+    """
+    if error.pos >= len(buffer):
+        return True
+    # Reported at the opening quote, and only raised when the string runs to the end
+    if error.msg.startswith("Unterminated string"):
+        return True
+    rest = buffer[error.pos:]
+    return any(literal != rest and literal.startswith(rest) for literal in _LITERALS)
+
+
+def _number_tail(value: Any, rest: str) -> bool:
+    return (
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        and rest[0] in ".eE" and not rest.lstrip(".eE+-0123456789")
+    )
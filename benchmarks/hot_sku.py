@@ -0,0 +1,71 @@
+"""
+Load test: concurrent stock reservations against a single hot product, with and without split stock.
+Needs a running MongoDB (MONGODB_URI); the product and its shards are removed afterwards.
+
+    python -m benchmarks.hot_sku [stock] [concurrency] [shards ...]
+"""
+import asyncio
+import sys
+import time
+from app.database import connect_db, disconnect_db, get_collection
+from app.models.product import Product
+from app.models.inventory import StockShard
+from app.crud import inventory as inventory_crud
+
+
+async def run_once(stock: int, concurrency: int, shards: int) -> dict:
+    result = await get_collection(Product).insert_one({
+        'name': 'Hot product', 'price': 1.0, 'stock': stock, 'stockShards': 0
+    })
+    product_id = result.inserted_id
+    try:
+        if shards:
+            await inventory_crud.split_stock(str(product_id), shards)
+
+        reserved = 0
+
+        async def buyer():
+            nonlocal reserved
+            while True:
+                if not await inventory_crud.reserve_stock(product_id, 1, shards):
+                    return
+                reserved += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(buyer() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        remaining, _ = await inventory_crud.get_stock(str(product_id))
+        return {
+            'shards': shards,
+            'reserved': reserved,
+            'remaining': remaining,
+            'oversold': reserved > stock or remaining < 0,
+            'seconds': elapsed,
+            'reservations_per_second': reserved / elapsed if elapsed > 0 else 0.0
+        }
+    finally:
+        await get_collection(Product).delete_one({'_id': product_id})
+        await get_collection(StockShard).delete_many({'product_id': product_id})
+
+
+async def main():
+    stock = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    shard_counts = [int(arg) for arg in sys.argv[3:]] or [0, 4, 16]
+
+    await connect_db()
+    try:
+        for shards in shard_counts:
+            result = await run_once(stock, concurrency, shards)
+            print(
+                f"shards={result['shards']:>3}: {result['reserved']} reserved in {result['seconds']:.2f} s "
+                f"({result['reservations_per_second']:.0f}/s), remaining={result['remaining']}, "
+                f"oversold={result['oversold']}"
+            )
+    finally:
+        await disconnect_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,242 @@
+"""
+Load test: drives a realistic request mix against the app and reports RPS and latency percentiles per route.
+
+By default the app runs in-process (lifespan included) against MONGODB_URI; --mongomock swaps in an
+in-memory database and --url targets an already running server instead. Results are written as JSON,
+so runs on different commits can be diffed.
+
+    python -m benchmarks.load [--mongomock | --url http://localhost:8000] [--duration 30] [--concurrency 32]
+                              [--users 50] [--products 500] [--seed 1] [--output results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+import httpx
+
+# Relative weights of what a shopper does; sign-in is rare because tokens are reused
+SCENARIO = (
+    ("browse", 40),
+    ("browse_next_page", 10),
+    ("lookup", 10),
+    ("cart_add", 15),
+    ("cart_reduce", 5),
+    ("cart_read", 10),
+    ("cart_summary", 8),
+    ("sign_in", 2),
+)
+PASSWORD = "load-test-password"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed: float) -> Dict:
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[route])
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "rps": round(len(values) / elapsed, 1),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "rps": round(total / elapsed, 1),
+            "routes": routes
+        }
+
+
+async def seed(client: httpx.AsyncClient, users: int, products: int, rng: random.Random) -> Dict:
+    run_id = uuid.uuid4().hex[:8]
+    product_ids = []
+    for i in range(products):
+        response = await client.post("/api/products", json={
+            "name": f"Load test product {i}",
+            "description": "Seeded by benchmarks.load",
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": rng.randint(10_000, 100_000)
+        })
+        response.raise_for_status()
+        product_ids.append(response.json()["id"])
+
+    accounts = []
+    for i in range(users):
+        email = f"load-{run_id}-{i}@example.com"
+        response = await client.post("/api/users", json={
+            "name": f"Load user {i}", "email": email, "password": PASSWORD, "dob": "1990-01-01"
+        })
+        response.raise_for_status()
+        body = response.json()
+        accounts.append({"id": body["user"]["id"], "email": email, "token": body["access_token"]})
+
+    return {"product_ids": product_ids, "accounts": accounts}
+
+
+async def shopper(client: httpx.AsyncClient, recorder: Recorder, data: Dict, rng: random.Random, deadline: float):
+    account = rng.choice(data["accounts"])
+    product_ids = data["product_ids"]
+    names = [name for name, _ in SCENARIO]
+    weights = [weight for _, weight in SCENARIO]
+    cursor = None
+
+    while time.perf_counter() < deadline:
+        action = rng.choices(names, weights)[0]
+        headers = {"Authorization": f"Bearer {account['token']}"}
+        user_id = account["id"]
+
+        if action == "browse":
+            response = await recorder.request(client, "GET /api/products", "GET", "/api/products", params={"limit": 20})
+            cursor = response.json().get("next_cursor") if response is not None and response.status_code == 200 else None
+        elif action == "browse_next_page":
+            params = {"limit": 20, "cursor": cursor} if cursor else {"limit": 20}
+            response = await recorder.request(client, "GET /api/products?cursor", "GET", "/api/products", params=params)
+            cursor = response.json().get("next_cursor") if response is not None and response.status_code == 200 else None
+        elif action == "lookup":
+            ids = ",".join(rng.sample(product_ids, min(20, len(product_ids))))
+            await recorder.request(client, "GET /api/products/lookup", "GET", "/api/products/lookup", params={"ids": ids})
+        elif action == "cart_add":
+            await recorder.request(
+                client, "POST /api/users/{user_id}/cart", "POST", f"/api/users/{user_id}/cart",
+                json={"product_id": rng.choice(product_ids)}, headers=headers
+            )
+        elif action == "cart_reduce":
+            await recorder.request(
+                client, "PATCH /api/users/{user_id}/cart/{product_id}/reduce", "PATCH",
+                f"/api/users/{user_id}/cart/{rng.choice(product_ids)}/reduce", headers=headers
+            )
+        elif action == "cart_read":
+            await recorder.request(
+                client, "GET /api/users/{user_id}/cart", "GET", f"/api/users/{user_id}/cart",
+                params={"expand": "product"}, headers=headers
+            )
+        elif action == "cart_summary":
+            await recorder.request(
+                client, "GET /api/users/{user_id}/cart/summary", "GET", f"/api/users/{user_id}/cart/summary", headers=headers
+            )
+        elif action == "sign_in":
+            response = await recorder.request(
+                client, "POST /api/users/sign_in", "POST", "/api/users/sign_in",
+                json={"email": account["email"], "password": PASSWORD}
+            )
+            if response is not None and response.status_code == 200:
+                account["token"] = response.json()["access_token"]
+
+
+def use_mongomock():
+    import app.database as database_module
+    from tests.mock_database import mock_client_class
+
+    database_module.AsyncIOMotorClient = mock_client_class("ecom_load")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.asynccontextmanager
+async def open_client(args):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+            yield client
+        return
+
+    if args.mongomock:
+        use_mongomock()
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=30) as client:
+            yield client
+
+
+async def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    async with open_client(args) as client:
+        data = await seed(client, args.users, args.products, rng)
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            shopper(client, recorder, data, random.Random(rng.random()), deadline) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "commit": git_commit(),
+        "target": args.url or ("in-process/mongomock" if args.mongomock else "in-process/" + os.environ.get("MONGODB_URI", "")),
+        "config": {
+            "duration": args.duration, "concurrency": args.concurrency, "users": args.users,
+            "products": args.products, "seed": args.seed
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        **recorder.report(elapsed)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API with a mixed shopper workload")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--mongomock", action="store_true", help="run in-process against an in-memory database")
+    target.add_argument("--url", help="base URL of a running server")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    body = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+        print(f"{results['requests']} requests, {results['rps']} req/s, {results['errors']} errors -> {args.output}", file=sys.stderr)
+    else:
+        print(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Microbenchmark: compiled serializers vs. the reflective format_mongo_to_pydantic path.
+
+    python -m benchmarks.serialization [documents] [rounds]
+"""
+import datetime
+import json
+import sys
+import timeit
+from typing import Dict, List
+import orjson
+from bson import ObjectId
+from pydantic import TypeAdapter
+from app.models.product import Product
+from app.schemas.product import ProductResponse
+from app.utils.formatting import get_serializer
+
+
+def make_documents(count: int) -> List[Dict]:
+    now = datetime.datetime(2024, 1, 1)
+    return [
+        {
+            '_id': ObjectId(),
+            'name': f'Product {i}',
+            'description': 'A reasonably sized product description. ' * 5,
+            'price': 10.0 + i,
+            'stock': i % 50,
+            'createdAt': now,
+            'updatedAt': now
+        }
+        for i in range(count)
+    ]
+
+
+# The pre-compilation path: MongoEngine documents, per-field reflection,
+# then FastAPI's response_model validation and JSON encoding
+def format_mongo_to_pydantic(document, schema):
+    document_data = {field: getattr(document, field) for field in schema.__annotations__.keys() if hasattr(document, field)}
+    for field in schema.__annotations__.keys():
+        if isinstance(document_data.get(field), ObjectId):
+            document_data[field] = str(document_data[field])
+        elif isinstance(document_data.get(field), datetime.datetime):
+            document_data[field] = document_data[field].isoformat()
+    return schema(**document_data)
+
+
+response_adapter = TypeAdapter(List[ProductResponse])
+
+
+def reflective(raw_documents: List[Dict]) -> bytes:
+    documents = [Product._from_son(raw) for raw in raw_documents]
+    models = [format_mongo_to_pydantic(document, ProductResponse) for document in documents]
+    validated = response_adapter.validate_python([model.model_dump() for model in models])
+    return json.dumps(response_adapter.dump_python(validated, mode='json')).encode()
+
+
+product_serializer = get_serializer(Product, ProductResponse)
+
+
+def compiled(raw_documents: List[Dict]) -> bytes:
+    return orjson.dumps(product_serializer.many(raw_documents))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    raw_documents = make_documents(count)
+
+    assert json.loads(reflective(raw_documents)) == json.loads(compiled(raw_documents))
+
+    results = {}
+    for name, func in (('reflective', reflective), ('compiled', compiled)):
+        best = min(timeit.repeat(lambda: func(raw_documents), number=1, repeat=rounds))
+        results[name] = best
+        print(f"{name:>10}: {best * 1000:8.2f} ms per {count} documents ({best / count * 1e6:.2f} us/doc)")
+
+    print(f"   speedup: {results['reflective'] / results['compiled']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import threading
+from contextlib import contextmanager
+import pytest
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost/ecom_test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+# Collection methods that each cost one round trip against a real server
+MONGO_COMMAND_METHODS = (
+    "find", "find_one", "find_one_and_update", "find_one_and_delete", "find_one_and_replace",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "bulk_write", "aggregate", "count_documents", "estimated_document_count", "distinct"
+)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    A TestClient for the app backed by an in-memory mongomock database.
+    """
+    pytest.importorskip("mongomock_motor")
+    from fastapi.testclient import TestClient
+    import app.database as database_module
+    from tests.mock_database import mock_client_class
+
+    monkeypatch.setattr(database_module, "AsyncIOMotorClient", mock_client_class("ecom_test"))
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def max_queries(monkeypatch):
+    """
+    Fail when a block issues more MongoDB commands than allowed, to catch N+1 regressions:
+
+        with max_queries(2):
+            client.get(f"/api/users/{user_id}/cart", headers=headers)
+
+    mongomock emits no command events, so its collection methods are counted instead.
+    Calls they make internally (find_one -> find) count once.
+    """
+    mongomock = pytest.importorskip("mongomock")
+    counter = {"count": 0}
+    state = threading.local()
+
+    def counted(method):
+        def wrapper(self, *args, **kwargs):
+            depth = getattr(state, "depth", 0)
+            if depth == 0:
+                counter["count"] += 1
+            state.depth = depth + 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                state.depth = depth
+        return wrapper
+
+    for name in MONGO_COMMAND_METHODS:
+        monkeypatch.setattr(mongomock.collection.Collection, name, counted(getattr(mongomock.collection.Collection, name)))
+
+    @contextmanager
+    def check(limit: int):
+        before = counter["count"]
+        yield
+        used = counter["count"] - before
+        assert used <= limit, f"{used} MongoDB commands, expected at most {limit}"
+
+    return check
@@ -0,0 +1,19 @@
+from typing import Type
+
+
+def mock_client_class(database_name: str) -> Type:
+    """
+    An AsyncIOMotorClient stand-in backed by in-memory mongomock, whose default database is
+    `database_name`. Patch it over app.database.AsyncIOMotorClient before connect_db runs.
+    Shared with the load benchmark's --mongomock mode; needs mongomock-motor from requirements-dev.txt.
+    """
+    from mongomock_motor import AsyncMongoMockClient
+
+    class MockClient(AsyncMongoMockClient):
+        def __init__(self, host=None, **kwargs):
+            super().__init__(host, **kwargs)
+
+        def get_default_database(self, default=None, **kwargs):
+            return self[database_name]
+
+    return MockClient
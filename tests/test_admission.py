@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from pymongo import _csot
+
+
+def gated_app(monkeypatch, max_concurrency=1, deadline=None, max_queue=0, queue_timeout=1.0):
+    """
+    A bare app behind AdmissionMiddleware whose /slow route holds its slot until `release` is set.
+    """
+    from fastapi import FastAPI
+    import app.admission as admission
+    from app.settings import settings
+    from app.utils.background import run_detached
+
+    monkeypatch.setattr(admission, "DEFAULT_POLICY", admission.RoutePolicy(max_concurrency, deadline))
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", max_queue)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT", queue_timeout)
+    monkeypatch.setattr(settings, "ADMISSION_RETRY_AFTER", 3)
+
+    app = FastAPI()
+    app.add_middleware(admission.AdmissionMiddleware)
+    app.state.entered = asyncio.Event()
+    app.state.release = asyncio.Event()
+
+    @app.get("/slow")
+    async def slow():
+        app.state.entered.set()
+        await app.state.release.wait()
+        return {"ok": True}
+
+    @app.get("/deadline")
+    async def deadline_seen():
+        async def detached_timeout():
+            return _csot.get_timeout()
+        return {"request": _csot.get_timeout(), "detached": await run_detached(detached_timeout())}
+
+    return app
+
+
+async def request(app, path):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path)
+
+
+def test_saturated_route_answers_503_with_retry_after(monkeypatch):
+    async def scenario():
+        app = gated_app(monkeypatch)
+        first = asyncio.create_task(request(app, "/slow"))
+        await app.state.entered.wait()
+
+        shed = await request(app, "/slow")
+        app.state.release.set()
+        return shed, await first
+
+    shed, first = asyncio.run(scenario())
+
+    assert first.status_code == 200
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "3"
+    assert "busy" in shed.json()["message"]
+
+
+def test_queued_request_gives_up_after_queue_timeout(monkeypatch):
+    async def scenario():
+        app = gated_app(monkeypatch, max_queue=1, queue_timeout=0.05)
+        first = asyncio.create_task(request(app, "/slow"))
+        await app.state.entered.wait()
+
+        queued = await request(app, "/slow")
+        app.state.release.set()
+        await first
+        return queued
+
+    assert asyncio.run(scenario()).status_code == 503
+
+
+def test_queued_request_runs_once_a_slot_frees(monkeypatch):
+    async def scenario():
+        app = gated_app(monkeypatch, max_queue=1, queue_timeout=5)
+        first = asyncio.create_task(request(app, "/slow"))
+        await app.state.entered.wait()
+
+        queued = asyncio.create_task(request(app, "/slow"))
+        await asyncio.sleep(0.05)
+        app.state.release.set()
+        return await first, await queued
+
+    first, queued = asyncio.run(scenario())
+
+    assert first.status_code == 200
+    assert queued.status_code == 200
+
+
+def test_deadline_applies_to_the_request_but_not_to_detached_work(monkeypatch):
+    response = asyncio.run(request(gated_app(monkeypatch, deadline=5), "/deadline"))
+
+    assert 0 < response.json()["request"] <= 5
+    assert response.json()["detached"] is None
+
+
+def test_database_timeout_maps_to_503(client, monkeypatch):
+    from pymongo.errors import ExecutionTimeout
+    from app.crud import product as product_crud
+
+    async def timed_out(*args, **kwargs):
+        raise ExecutionTimeout("operation exceeded time limit", code=50)
+
+    monkeypatch.setattr(product_crud, "search_products", timed_out)
+    response = client.get("/api/products/search")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,81 @@
+def sign_up(client):
+    response = client.post("/api/users", json={"name": "Shopper", "email": "cart@example.com", "password": "pw", "dob": "1990-01-01"})
+    body = response.json()
+    return body["user"]["id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def fill_cart(client, user_id, headers, count):
+    for i in range(count):
+        product = client.post("/api/products", json={"name": f"Item {i}", "description": "", "price": 1.5, "stock": i})
+        client.post(f"/api/users/{user_id}/cart", json={"product_id": product.json()["id"]}, headers=headers)
+
+
+def test_cart_reads_cost_one_query_regardless_of_size(client, max_queries):
+    user_id, headers = sign_up(client)
+    fill_cart(client, user_id, headers, 5)
+
+    with max_queries(1):
+        response = client.get(f"/api/users/{user_id}/cart", headers=headers)
+    assert len(response.json()) == 5
+
+    with max_queries(1):
+        response = client.get(f"/api/users/{user_id}/cart", params={"expand": "product"}, headers=headers)
+    assert [item["product"]["name"] for item in response.json()] == [f"Item {i}" for i in range(5)]
+
+    with max_queries(1):
+        response = client.get(f"/api/users/{user_id}/cart/summary", headers=headers)
+    assert response.json()["items"] == 5
+    assert len(response.json()["out_of_stock"]) == 1
+
+
+def test_buffered_reduce_of_a_missing_item_does_not_cancel_a_later_add(client, monkeypatch):
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "CART_WRITE_BEHIND", True)
+    user_id, headers = sign_up(client)
+    product_id = client.post("/api/products", json={"name": "Item", "description": "", "price": 1.0, "stock": 5}).json()["id"]
+
+    assert client.patch(f"/api/users/{user_id}/cart/{product_id}/reduce", headers=headers).status_code == 404
+    assert client.post(f"/api/users/{user_id}/cart", json={"product_id": product_id}, headers=headers).status_code == 202
+    assert client.get(f"/api/users/{user_id}/cart", headers=headers).json()[0]["quantity"] == 1
+
+    # Down to zero and past it, then back up: the refused reduce leaves nothing behind
+    assert client.patch(f"/api/users/{user_id}/cart/{product_id}/reduce", headers=headers).status_code == 202
+    assert client.patch(f"/api/users/{user_id}/cart/{product_id}/reduce", headers=headers).status_code == 404
+    assert client.post(f"/api/users/{user_id}/cart", json={"product_id": product_id}, headers=headers).status_code == 202
+    assert client.get(f"/api/users/{user_id}/cart", headers=headers).json()[0]["quantity"] == 1
+
+
+def test_buffer_flush_only_holds_up_reads_of_users_in_the_batch(monkeypatch):
+    import asyncio
+    from bson import ObjectId
+    from app.cart_buffer import CartWriteBuffer
+    from app.crud import cart as cart_crud
+
+    written = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow_apply_cart_deltas(deltas):
+            await release.wait()
+            written.append(deltas)
+
+        monkeypatch.setattr(cart_crud, "apply_cart_deltas", slow_apply_cart_deltas)
+        buffer = CartWriteBuffer(flush_interval=60, max_pending=100)
+        batched, other, product_id = str(ObjectId()), str(ObjectId()), str(ObjectId())
+        await buffer.add(batched, product_id, 1)
+
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        # Nothing of theirs is being written, so their read doesn't wait for the bulk write
+        await asyncio.wait_for(buffer.flush_user(other), 1)
+
+        read = asyncio.create_task(buffer.flush_user(batched))
+        await asyncio.sleep(0.01)
+        assert not read.done()
+        release.set()
+        await asyncio.gather(flush, read)
+
+    asyncio.run(scenario())
+    assert len(written) == 1
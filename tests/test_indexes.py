@@ -0,0 +1,87 @@
+import asyncio
+import os
+import random
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# The plan check needs a real server; mongomock has no query planner
+TEST_MONGODB_URI = os.environ.get("TEST_MONGODB_URI", "mongodb://localhost:27017/ecom_plan_check")
+
+
+@pytest.fixture
+def mongod_uri():
+    try:
+        with MongoClient(TEST_MONGODB_URI, serverSelectionTimeoutMS=500) as mongo:
+            mongo.admin.command("ping")
+    except PyMongoError:
+        # CI provides a server, so there a missing one is a failure rather than a silent skip
+        if os.environ.get("REQUIRE_TEST_MONGODB"):
+            raise
+        pytest.skip(f"No MongoDB server reachable at {TEST_MONGODB_URI}")
+    return TEST_MONGODB_URI
+
+
+def test_every_search_combination_is_index_bounded(mongod_uri, monkeypatch):
+    from app.settings import settings
+    from app.database import connect_db, disconnect_db, get_collection
+    from app.indexes import check_search_plans, reconcile_indexes
+    from app.models.product import Product
+    from app.seed import generate_products
+
+    monkeypatch.setattr(settings, "MONGODB_URI", mongod_uri)
+    rng = random.Random(7)
+    products = list(generate_products(rng, 2000))
+    for product in products:
+        # Plenty of out of stock products, and a few split ones, for the in-stock filter to skip
+        if rng.random() < 0.4:
+            product['stock'] = 0
+            product['stockShards'] = 8 if rng.random() < 0.1 else 0
+
+    async def check():
+        await connect_db()
+        try:
+            collection = get_collection(Product)
+            await collection.drop()
+            await collection.insert_many(products)
+            await reconcile_indexes(Product)
+            return await check_search_plans()
+        finally:
+            await get_collection(Product).drop()
+            await disconnect_db()
+
+    assert asyncio.run(check()) == []
+
+
+def test_duplicate_cart_items_fail_only_their_index_until_merged(client):
+    import datetime
+    from bson import ObjectId
+    from app.crud.cart import merge_duplicate_cart_items
+    from app.database import get_collection
+    from app.indexes import reconcile_indexes
+    from app.models.cart import CartItem
+
+    user_id, product_id = ObjectId(), ObjectId()
+    now = datetime.datetime.utcnow()
+
+    async def setup():
+        collection = get_collection(CartItem)
+        await collection.drop()
+        await collection.insert_many([
+            {'user_id': user_id, 'product_id': product_id, 'quantity': quantity, 'createdAt': now, 'updatedAt': now}
+            for quantity in (1, 2, 4)
+        ])
+
+    client.portal.call(setup)
+    report = client.portal.call(reconcile_indexes, CartItem)
+    assert len(report.failed) == 1
+    assert "user_id: 1, product_id: 1" in report.failed[0]
+
+    assert client.portal.call(merge_duplicate_cart_items) == 2
+    report = client.portal.call(reconcile_indexes, CartItem)
+    assert report.failed == []
+
+    async def cart_items():
+        return await get_collection(CartItem).find({}, {'_id': 0, 'quantity': 1}).to_list(length=None)
+
+    assert client.portal.call(cart_items) == [{'quantity': 7}]
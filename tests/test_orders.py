@@ -0,0 +1,136 @@
+import pytest
+
+
+def sign_up(client, email="shopper@example.com"):
+    response = client.post("/api/users", json={"name": "Shopper", "email": email, "password": "pw", "dob": "1990-01-01"})
+    body = response.json()
+    return body["user"]["id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def create_product(client, stock):
+    response = client.post("/api/products", json={"name": "Widget", "description": "A widget", "price": 2.0, "stock": stock})
+    return response.json()["id"]
+
+
+def add_to_cart(client, user_id, headers, product_id, quantity):
+    for _ in range(quantity):
+        assert client.post(f"/api/users/{user_id}/cart", json={"product_id": product_id}, headers=headers).status_code == 201
+
+
+def test_checkout_gathers_units_from_several_shards(client):
+    user_id, headers = sign_up(client)
+    product_id = create_product(client, stock=80)
+    client.post(f"/api/products/{product_id}/stock_shards", json={"shards": 16})
+    add_to_cart(client, user_id, headers, product_id, 10)
+
+    response = client.post(f"/api/users/{user_id}/checkout", headers=headers)
+
+    assert response.status_code == 201
+    assert response.json()["items"][0]["quantity"] == 10
+    assert client.get(f"/api/products/{product_id}/stock").json()["stock"] == 70
+
+    order_id = response.json()["id"]
+    assert client.post(f"/api/users/{user_id}/orders/{order_id}/cancel", headers=headers).status_code == 200
+    assert client.get(f"/api/products/{product_id}/stock").json()["stock"] == 80
+
+
+def test_checkout_releases_partial_takes_when_stock_is_short(client):
+    user_id, headers = sign_up(client)
+    product_id = create_product(client, stock=9)
+    client.post(f"/api/products/{product_id}/stock_shards", json={"shards": 3})
+    add_to_cart(client, user_id, headers, product_id, 10)
+
+    response = client.post(f"/api/users/{user_id}/checkout", headers=headers)
+
+    assert response.status_code == 409
+    assert client.get(f"/api/products/{product_id}/stock").json()["stock"] == 9
+    # The claimed cart is put back for another try
+    assert client.get(f"/api/users/{user_id}/cart", headers=headers).json()[0]["quantity"] == 10
+
+
+def test_checkout_of_a_cart_claimed_by_another_checkout_reserves_nothing(client, monkeypatch):
+    from app.crud import cart as cart_crud
+
+    user_id, headers = sign_up(client)
+    product_id = create_product(client, stock=5)
+    add_to_cart(client, user_id, headers, product_id, 2)
+    # What a concurrent checkout read before this one emptied the cart
+    stale_cart = client.portal.call(cart_crud.get_cart_items_with_products, user_id)
+
+    assert client.post(f"/api/users/{user_id}/checkout", headers=headers).status_code == 201
+
+    async def get_stale_cart(user_id):
+        return stale_cart
+
+    monkeypatch.setattr(cart_crud, "get_cart_items_with_products", get_stale_cart)
+    response = client.post(f"/api/users/{user_id}/checkout", headers=headers)
+
+    assert response.status_code == 409
+    assert client.get(f"/api/products/{product_id}/stock").json()["stock"] == 3
+
+
+def test_cancel_that_fails_midway_is_finished_by_the_sweeper(client, monkeypatch):
+    import datetime
+    from bson import ObjectId
+    from app.crud import inventory as inventory_crud
+    from app.database import get_collection
+    from app.models.order import Order
+    from app.reservations import expire_reservations
+
+    user_id, headers = sign_up(client)
+    first, second = create_product(client, stock=5), create_product(client, stock=5)
+    add_to_cart(client, user_id, headers, first, 2)
+    add_to_cart(client, user_id, headers, second, 3)
+    order_id = client.post(f"/api/users/{user_id}/checkout", headers=headers).json()["id"]
+
+    release_stock = inventory_crud.release_stock
+    calls = []
+
+    async def failing_release_stock(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("database went away")
+        await release_stock(*args, **kwargs)
+
+    monkeypatch.setattr(inventory_crud, "release_stock", failing_release_stock)
+    with pytest.raises(RuntimeError):
+        client.post(f"/api/users/{user_id}/orders/{order_id}/cancel", headers=headers)
+    monkeypatch.setattr(inventory_crud, "release_stock", release_stock)
+
+    assert client.get(f"/api/users/{user_id}/orders/{order_id}", headers=headers).json()["status"] == "releasing"
+
+    async def sweep_after_lease():
+        await get_collection(Order).update_one(
+            {'_id': ObjectId(order_id)}, {'$set': {'updatedAt': datetime.datetime.utcnow() - datetime.timedelta(hours=1)}}
+        )
+        return await expire_reservations()
+
+    assert client.portal.call(sweep_after_lease) == 1
+    assert client.get(f"/api/users/{user_id}/orders/{order_id}", headers=headers).json()["status"] == "cancelled"
+    # The take released before the failure isn't returned twice
+    assert client.get(f"/api/products/{first}/stock").json()["stock"] == 5
+    assert client.get(f"/api/products/{second}/stock").json()["stock"] == 5
+
+
+def test_reservation_failing_midway_gives_back_partial_takes(client, monkeypatch):
+    from bson import ObjectId
+    from app.crud import inventory as inventory_crud
+
+    product_id = create_product(client, stock=9)
+    client.post(f"/api/products/{product_id}/stock_shards", json={"shards": 3})
+
+    take_shard_stock = inventory_crud.take_shard_stock
+    calls = []
+
+    async def failing_take_shard_stock(*args):
+        calls.append(args)
+        if len(calls) == 4:
+            raise RuntimeError("database went away")
+        return await take_shard_stock(*args)
+
+    monkeypatch.setattr(inventory_crud, "take_shard_stock", failing_take_shard_stock)
+    with pytest.raises(RuntimeError):
+        client.portal.call(inventory_crud.reserve_stock, ObjectId(product_id), 8, 3)
+
+    assert len(calls) == 4
+    assert client.get(f"/api/products/{product_id}/stock").json()["stock"] == 9
@@ -0,0 +1,149 @@
+def create_product(client, **fields):
+    body = {"name": "Widget", "description": "A widget", "price": 9.5, "stock": 10, **fields}
+    response = client.post("/api/products", json=body)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_import_updates_existing_product_by_sku(client):
+    product_id = create_product(client, sku="SKU-1")
+
+    response = client.post("/api/products/import", json=[
+        {"sku": "SKU-1", "name": "Widget v2", "description": "A widget", "price": 12.0, "stock": 7},
+        {"sku": "SKU-2", "name": "Gadget", "description": "A gadget", "price": 3.0, "stock": 1}
+    ])
+
+    assert response.status_code == 200
+    assert response.json()["matched"] == 1
+    assert response.json()["upserted"] == 1
+    assert client.get(f"/api/products/{product_id}/stock").json() == {"id": product_id, "stock": 7, "shards": 0}
+
+
+def test_import_rejects_split_product_and_keeps_its_shards(client):
+    product_id = create_product(client, sku="SKU-1", stock=80)
+    assert client.post(f"/api/products/{product_id}/stock_shards", json={"shards": 16}).status_code == 200
+
+    response = client.post("/api/products/import", json=[
+        {"sku": "SKU-1", "name": "Widget", "description": "A widget", "price": 9.5, "stock": 5}
+    ])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["failed"] == 1
+    assert body["errors"][0]["row"] == 1
+    assert "merge" in body["errors"][0]["message"]
+    assert client.get(f"/api/products/{product_id}/stock").json() == {"id": product_id, "stock": 80, "shards": 16}
+
+    # Once merged, the import may overwrite the stock again
+    assert client.delete(f"/api/products/{product_id}/stock_shards").status_code == 200
+    response = client.post("/api/products/import", json=[
+        {"sku": "SKU-1", "name": "Widget", "description": "A widget", "price": 9.5, "stock": 5}
+    ])
+    assert response.json()["matched"] == 1
+    assert client.get(f"/api/products/{product_id}/stock").json() == {"id": product_id, "stock": 5, "shards": 0}
+
+
+def test_import_reports_a_malformed_row_without_reading_the_rest_of_the_body():
+    import asyncio
+    import pytest
+    from app.utils.upload import UploadFormatError, iter_json_array_rows
+
+    read = []
+
+    async def chunks():
+        for chunk in [b'[{"sku": "A", "na', b'me": "Lamp"}, {bad}, '] + [b'{"sku": "B"}, '] * 1000 + [b']']:
+            read.append(chunk)
+            yield chunk
+
+    async def parse():
+        return [row async for row in iter_json_array_rows(chunks())]
+
+    with pytest.raises(UploadFormatError, match="row 2"):
+        asyncio.run(parse())
+    assert len(read) == 2
+
+
+def test_lookup_by_query_returns_items_in_request_order_and_missing_ids(client):
+    first = create_product(client, name="First")
+    second = create_product(client, name="Second")
+    unknown = "0" * 24
+
+    response = client.get("/api/products/lookup", params={"ids": f"{second},{unknown},{first}"})
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [second, first]
+    assert response.json()["missing"] == [unknown]
+
+
+def test_split_product_reports_total_stock_and_refuses_stock_overwrites(client):
+    product_id = create_product(client, stock=80)
+    assert client.post(f"/api/products/{product_id}/stock_shards", json={"shards": 4}).status_code == 200
+
+    assert client.get("/api/products").json()["items"][0]["stock"] == 80
+    assert client.get("/api/products", params={"fields": "stock"}).json()["items"][0]["stock"] == 80
+    assert client.get("/api/products/lookup", params={"ids": product_id}).json()["items"][0]["stock"] == 80
+    assert client.get("/api/products/search").json()["items"][0]["stock"] == 80
+
+    response = client.put(f"/api/products/{product_id}", json={"stock": 10})
+    assert response.status_code == 409
+    response = client.put(f"/api/products/{product_id}", json={"price": 11.0})
+    assert response.json()["stock"] == 80
+
+    response = client.patch("/api/products", json=[{"id": product_id, "stock": 5}, {"id": product_id, "stock_delta": 3}])
+    assert [error["index"] for error in response.json()["errors"]] == [0]
+    assert "split" in response.json()["errors"][0]["message"]
+    assert client.get(f"/api/products/{product_id}/stock").json()["stock"] == 83
+
+
+def test_search_filters_and_pages_in_stock_products(client):
+    expected = []
+    for i in range(12):
+        stock = 0 if i % 3 == 0 else 5
+        response = client.post("/api/products", json={"name": f"Item {i}", "description": "", "price": float(i), "stock": stock})
+        if stock and i >= 4:
+            expected.append(response.json()["id"])
+    split = client.post("/api/products", json={"name": "Split", "description": "", "price": 50.0, "stock": 8}).json()["id"]
+    client.post(f"/api/products/{split}/stock_shards", json={"shards": 2})
+    expected.append(split)
+
+    found = []
+    params = {"in_stock": "true", "min_price": 4, "sort": "price_asc", "limit": 2}
+    while True:
+        page = client.get("/api/products/search", params=params).json()
+        found += [item["id"] for item in page["items"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert found == expected
+
+
+def test_product_list_revalidates_until_a_write_changes_it(client, monkeypatch):
+    import datetime
+    from email.utils import parsedate_to_datetime
+    from app.routers.product import catalog_cache
+
+    product_id = create_product(client)
+    # Back-dated so the write below moves Last-Modified despite its one second resolution
+    monkeypatch.setattr(catalog_cache, "cleared_at", datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+
+    first = client.get("/api/products")
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+    assert first.status_code == 200
+
+    response = client.get("/api/products", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert client.get("/api/products", headers={"If-Modified-Since": last_modified}).status_code == 304
+    earlier = parsedate_to_datetime(last_modified) - datetime.timedelta(seconds=1)
+    assert client.get("/api/products", headers={"If-Modified-Since": earlier.strftime("%a, %d %b %Y %H:%M:%S GMT")}).status_code == 200
+
+    client.put(f"/api/products/{product_id}", json={"price": 11.0})
+
+    response = client.get("/api/products", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["items"][0]["price"] == 11.0
+    assert response.headers["ETag"] != etag
+    assert parsedate_to_datetime(response.headers["Last-Modified"]) > parsedate_to_datetime(last_modified)
+    assert client.get("/api/products", headers={"If-Modified-Since": last_modified}).status_code == 200
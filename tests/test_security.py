@@ -0,0 +1,110 @@
+import pytest
+
+CREDENTIALS = {"email": "auth@example.com", "password": "pw"}
+
+
+def sign_up(client):
+    response = client.post("/api/users", json={"name": "Shopper", "dob": "1990-01-01", **CREDENTIALS})
+    body = response.json()
+    return body["user"]["id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def sign_in(client):
+    body = client.post("/api/users/sign_in", json=CREDENTIALS).json()
+    return {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def is_authenticated(client, user_id, headers):
+    # An empty cart answers 404 once past authentication
+    return client.get(f"/api/users/{user_id}/cart", headers=headers).status_code != 401
+
+
+@pytest.fixture(params=[False, True], ids=["user-lookup", "trust-claims"])
+def auth_mode(request, monkeypatch):
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "AUTH_TRUST_TOKEN_CLAIMS", request.param)
+    return request.param
+
+
+def test_sign_out_revokes_only_that_token(client, auth_mode):
+    user_id, headers = sign_up(client)
+    other_device = sign_in(client)
+    # Cached by the first use, so the revoke must also reach the cached entry
+    assert is_authenticated(client, user_id, headers)
+
+    assert client.post(f"/api/users/{user_id}/sign_out", headers=headers).status_code == 200
+
+    assert not is_authenticated(client, user_id, headers)
+    assert is_authenticated(client, user_id, other_device)
+
+
+def test_sign_out_of_all_devices_revokes_every_earlier_token(client, auth_mode):
+    user_id, headers = sign_up(client)
+    other_device = sign_in(client)
+    assert is_authenticated(client, user_id, other_device)
+
+    response = client.post(f"/api/users/{user_id}/sign_out", params={"all_devices": "true"}, headers=headers)
+    assert response.status_code == 200
+
+    assert not is_authenticated(client, user_id, headers)
+    assert not is_authenticated(client, user_id, other_device)
+    assert is_authenticated(client, user_id, sign_in(client))
+
+
+def test_cached_token_revoked_by_another_worker_is_rejected_after_refresh(client):
+    import datetime
+    from app.crud.token import revoke_token
+    from app.security import token_denylist
+    from app.utils.jwt import verify_token
+
+    user_id, headers = sign_up(client)
+    assert is_authenticated(client, user_id, headers)
+
+    payload = verify_token(headers["Authorization"].split()[1])
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    # Written straight to the database, as another worker would
+    client.portal.call(revoke_token, user_id, payload["jti"], expires_at)
+    assert is_authenticated(client, user_id, headers)
+
+    client.portal.call(token_denylist.refresh)
+    assert not is_authenticated(client, user_id, headers)
+
+
+def test_refresh_keeps_revocations_made_while_it_reads(monkeypatch):
+    import asyncio
+    import app.security as security
+
+    denylist = security.TokenDenylist()
+
+    async def get_active_revocations():
+        # Revoked by this process after the query's snapshot was taken
+        denylist.add_token("revoked-meanwhile")
+        denylist.add_user_version("user-1", 3)
+        return [{"jti": "stored"}]
+
+    monkeypatch.setattr(security, "get_active_revocations", get_active_revocations)
+    asyncio.run(denylist.refresh())
+
+    assert denylist.revoked_ids == {"stored", "revoked-meanwhile"}
+    assert denylist.is_revoked({"sub": "user-1", "ver": 2})
+    assert not denylist.is_revoked({"sub": "user-1", "ver": 3})
+
+
+def test_invalidating_a_user_drops_only_their_cached_tokens(client):
+    from app.security import user_authenticator
+
+    user_id, headers = sign_up(client)
+    other_device = sign_in(client)
+    assert is_authenticated(client, user_id, headers)
+    assert is_authenticated(client, user_id, other_device)
+    stats = client.get("/api/users/cache_stats").json()
+
+    user_authenticator.invalidate_user(user_id)
+
+    after = client.get("/api/users/cache_stats").json()
+    assert after["size"] == stats["size"] - 2
+    assert after["users"] == stats["users"] - 1
+    misses = after["misses"]
+    assert is_authenticated(client, user_id, headers)
+    assert client.get("/api/users/cache_stats").json()["misses"] == misses + 1